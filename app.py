@@ -1,3 +1,4 @@
+import os
 import dash
 import dash_bootstrap_components as dbc
 
@@ -9,3 +10,7 @@ external_stylesheets = [dbc.themes.BOOTSTRAP]
 
 app = dash.Dash(__name__, external_scripts=external_scripts, external_stylesheets=external_stylesheets)
 app.config.suppress_callback_exceptions = True
+
+# The diagnostics page (/diagnostics) and arming CPU profiles (POST /profiles, ?profile=1, the home page button)
+# are only served with DASHBOARD_DIAGNOSTICS=1, they expose internals and slow down the profiled requests
+diagnostics_enabled = os.environ.get('DASHBOARD_DIAGNOSTICS', '0') == '1'
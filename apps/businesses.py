@@ -3,6 +3,7 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 from app import app
+from backend.tracing import traced_callback
 import apps.dcc_functions as f
 
 ########################################################################################################################
@@ -98,6 +99,7 @@ layout = html.Div([
         Input('url', 'pathname')
     ]
 )
+@traced_callback
 def callbacks(none):
     return
 
@@ -118,6 +120,7 @@ def callbacks(none):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -148,6 +151,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -166,6 +170,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -184,6 +189,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -203,6 +209,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -222,6 +229,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -4,185 +4,126 @@ import dash_bootstrap_components as dbc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
 from app import app
+from backend.tracing import traced_callback
 import apps.dcc_functions as f
+from backend.dimensions import cpv_names
 
 
-cpv_division = [
-    ['Clothing, footwear, luggage articles and accessories', '18'],
-    ['Leather and textile fabrics, plastic and rubber materials',
-    '19'],
-    ['Installation services (except software)', '51'],
-    ['Construction structures and materials; auxiliary products to construction (except electric apparatus)',
-    '44'],
-    ['Office and computing machinery, equipment and supplies except furniture and software packages',
-    '30'],
-    ['Research and development services and related consultancy services',
-    '73'],
-    ['Repair and maintenance services', '50'],
-    ['Medical equipments, pharmaceuticals and personal care products',
-    '33'],
-    ['Transport equipment and auxiliary products to transportation',
-    '34'],
-    ['Health and social work services', '85'],
-    ['Financial and insurance services', '66'],
-    ['Electrical machinery, apparatus, equipment and consumables; lighting',
-    '31'],
-    ['Education and training services', '80'],
-    ['Real estate services', '70'],
-    ['Public utilities', '65'],
-    ['IT services: consulting, software development, Internet and support',
-    '72'],
-    ['Sewage, refuse, cleaning and environmental services', '90'],
-    ['Food, beverages, tobacco and related products', '15'],
-    ['Business services: law, marketing, consulting, recruitment, printing and security',
-    '79'],
-    ['Security, fire-fighting, police and defence equipment', '35'],
-    ['Services related to the oil and gas industry', '76'],
-    ['Petroleum products, fuel, electricity and other sources of energy',
-    '09'],
-    ['Administration, defence and social security services', '75'],
-    ['Radio, television, communication, telecommunication and related equipment',
-    '32'],
-    ['Agricultural, farming, fishing, forestry and related products',
-    '03'],
-    ['Recreational, cultural and sporting services', '92'],
-    ['Other community, social and personal services', '98'],
-    ['Construction work', '45'],
-    ['Supporting and auxiliary transport services; travel agencies services',
-    '63'],
-    ['Laboratory, optical and precision equipments (excl. glasses)',
-    '38'],
-    ['Agricultural, forestry, horticultural, aquacultural and apicultural services',
-    '77'],
-    ['Furniture (incl. office furniture), furnishings, domestic appliances (excl. lighting) and cleaning products',
-    '39'],
-    ['Software package and information systems', '48'],
-    ['Transport services (excl. Waste transport)', '60'],
-    ['Agricultural machinery', '16'],
-    ['Architectural, construction, engineering and inspection services',
-    '71'],
-    ['Hotel, restaurant and retail trade services', '55'],
-    ['Musical instruments, sport goods, games, toys, handicraft, art materials and accessories',
-    '37'],
-    ['Postal and telecommunications services', '64'],
-    ['Collected and purified water', '41'],
-    ['Machinery for mining, quarrying, construction equipment', '43'],
-    ['Industrial machinery', '42'],
-    ['Mining, basic metals and related products', '14'],
-    ['Printed matter and related products', '22'],
-    ['Chemical products', '24']
-]
-
-cpv_options = [dict(label=cpv[0], value=cpv[1]) for cpv in cpv_division]
-
-cpv_dropdown = dcc.Dropdown(
-                id='cpv_drop',
-                options=cpv_options,
-                value=cpv_division[0][1],
-                multi=False
-            ),
+def render_cpv_dropdown():
+    cpv_division = [[description, code] for code, description in cpv_names().items()]
 
+    return dcc.Dropdown(
+        id='cpv_drop',
+        options=[dict(label=cpv[0], value=cpv[1]) for cpv in cpv_division],
+        value=cpv_division[0][1],
+        multi=False
+    )
 
-########################################################################################################################
 
+########################################################################################################################
 
-layout = html.Div([
 
-    html.Div([
+def render_layout():
+    """
+    The page is built per visit, the CPV Division dropdown has the current dimension values
+    """
+    return html.Div([
 
-        html.Br(),
-        html.Div([
-            html.H4('Average CPV Division Expenditure'),
-            dbc.Spinner(html.H4(id='box_1', className='box_1'))
-        ], style={'margin': 'auto', 'width': '25%', 'height': '25%', 'margin-top': '20px'}),
         html.Div([
+
+            html.Br(),
             html.Div([
-                html.H4('Average CPV Division Contract Count'),
-                dbc.Spinner(html.H4(id='box_2', className='box_2'))
-            ], style={'width': '25%', 'margin-left': '10%'}),
-            html.Div([
-                html.H4('Average CPV Division Contract Offers'),
-                dbc.Spinner(html.H4(id='box_3', className='box_3'))
-            ], style={'width': '25%', 'margin-left': '30%'}),
-        ], style={'display': 'flex', 'height': '25%', 'margin-top': '20px'}),
-        html.Div([
+                html.H4('Average CPV Division Expenditure'),
+                dbc.Spinner(html.H4(id='box_1', className='box_1'))
+            ], style={'margin': 'auto', 'width': '25%', 'height': '25%', 'margin-top': '20px'}),
             html.Div([
-                html.H4('Average CPV Division Expenditure with EU Funds'),
-                dbc.Spinner(html.H4(id='box_4', className='box_4'))
-            ], style={'width': '25%', 'margin-left': '24%'}),
+                html.Div([
+                    html.H4('Average CPV Division Contract Count'),
+                    dbc.Spinner(html.H4(id='box_2', className='box_2'))
+                ], style={'width': '25%', 'margin-left': '10%'}),
+                html.Div([
+                    html.H4('Average CPV Division Contract Offers'),
+                    dbc.Spinner(html.H4(id='box_3', className='box_3'))
+                ], style={'width': '25%', 'margin-left': '30%'}),
+            ], style={'display': 'flex', 'height': '25%', 'margin-top': '20px'}),
             html.Div([
-                html.H4('Average CPV Division Expenditure without EU Funds'),
-                dbc.Spinner(html.H4(id='box_5', className='box_5'))
-            ], style={'width': '25%', 'margin-left': '2%'}),
-        ], style={'display': 'flex', 'height': '25%', 'margin-top': '20px'}),
-    ], style={'margin': 'auto', 'height': '520px', 'margin-top': '50px'}),
-
-    html.H3('CPV Division Contract Counts', style={'height': '10%', 'text-align': 'center', 'margin-top': '100px'}),
-    html.Br(),
-    dbc.Spinner(dcc.Graph(id='treemap')),
+                html.Div([
+                    html.H4('Average CPV Division Expenditure with EU Funds'),
+                    dbc.Spinner(html.H4(id='box_4', className='box_4'))
+                ], style={'width': '25%', 'margin-left': '24%'}),
+                html.Div([
+                    html.H4('Average CPV Division Expenditure without EU Funds'),
+                    dbc.Spinner(html.H4(id='box_5', className='box_5'))
+                ], style={'width': '25%', 'margin-left': '2%'}),
+            ], style={'display': 'flex', 'height': '25%', 'margin-top': '20px'}),
+        ], style={'margin': 'auto', 'height': '520px', 'margin-top': '50px'}),
+
+        html.H3('CPV Division Contract Counts', style={'height': '10%', 'text-align': 'center', 'margin-top': '100px'}),
+        html.Br(),
+        dbc.Spinner(dcc.Graph(id='treemap')),
 
-    html.Br(),
-    html.Br(),
-    html.Br(),
+        html.Br(),
+        html.Br(),
+        html.Br(),
 
-    html.H3('CPV Division Average Expenditure', style={'height': '10%', 'text-align': 'center'}),
+        html.H3('CPV Division Average Expenditure', style={'height': '10%', 'text-align': 'center'}),
 
-    html.Div([
         html.Div([
-            html.Div([html.H4('The Highest value Divisions'), dbc.Spinner(dcc.Graph(id='bar_1'))], style={'width': '45%'}),
-            html.Div([], style={'width': '10%'}),
-            html.Div([html.H4('The Lowest value Divisions'), dbc.Spinner(dcc.Graph(id='bar_2'))], style={'width': '45%'}),
-        ], style={'display': 'flex'})
-    ]),
+            html.Div([
+                html.Div([html.H4('The Highest value Divisions'), dbc.Spinner(dcc.Graph(id='bar_1'))], style={'width': '45%'}),
+                html.Div([], style={'width': '10%'}),
+                html.Div([html.H4('The Lowest value Divisions'), dbc.Spinner(dcc.Graph(id='bar_2'))], style={'width': '45%'}),
+            ], style={'display': 'flex'})
+        ]),
 
-    html.Br(),
-    html.Br(),
-    html.Br(),
+        html.Br(),
+        html.Br(),
+        html.Br(),
 
-    html.H3('Countries Most Profitable CPV Division', style={'height': '10%', 'text-align': 'center'}),
+        html.H3('Countries Most Profitable CPV Division', style={'height': '10%', 'text-align': 'center'}),
 
-    html.Div([
-        dbc.Spinner(dcc.Graph(id='cpv_map'))
-    ], style={'height': '10%', 'text-align': 'center'}),
+        html.Div([
+            dbc.Spinner(dcc.Graph(id='cpv_map'))
+        ], style={'height': '10%', 'text-align': 'center'}),
 
-    html.Br(),
-    html.Br(),
-    html.Br(),
+        html.Br(),
+        html.Br(),
+        html.Br(),
 
-    html.H3('Contract Distribution by CPV Division', style={'height': '10%', 'text-align': 'center'}),
-    html.Div([
+        html.H3('Contract Distribution by CPV Division', style={'height': '10%', 'text-align': 'center'}),
         html.Div([
-            html.Div(cpv_dropdown, style={'height': '20%'}),
-            html.Br(),
-            html.Div([dbc.Spinner(dcc.Graph(id='hist'))], style={'height': '80%'}),
-        ])
-    ]),
+            html.Div([
+                html.Div(render_cpv_dropdown(), style={'height': '20%'}),
+                html.Br(),
+                html.Div([dbc.Spinner(dcc.Graph(id='hist'))], style={'height': '80%'}),
+            ])
+        ]),
 
-    html.Br(),
-    html.Br(),
-    html.Br(),
+        html.Br(),
+        html.Br(),
+        html.Br(),
 
-    html.H3('European Investment on CPV Divisions ', style={'height': '10%', 'text-align': 'center'}),
+        html.H3('European Investment on CPV Divisions ', style={'height': '10%', 'text-align': 'center'}),
 
-    html.Br(),
+        html.Br(),
 
-    html.Div([
         html.Div([
-            html.Div([html.H4('Highest Average CPV Divisions with EU Funds'), dbc.Spinner(dcc.Graph(id='bar_3'))], style={'width': '45%'}),
-            html.Div([], style={'width': '5%'}),
-            html.Div([html.H4('Highest Average CPV Divisions without EU Funds'), dbc.Spinner(dcc.Graph(id='bar_4'))], style={'width': '50%'}),
-        ], style={'display': 'flex'})
-    ]),
+            html.Div([
+                html.Div([html.H4('Highest Average CPV Divisions with EU Funds'), dbc.Spinner(dcc.Graph(id='bar_3'))], style={'width': '45%'}),
+                html.Div([], style={'width': '5%'}),
+                html.Div([html.H4('Highest Average CPV Divisions without EU Funds'), dbc.Spinner(dcc.Graph(id='bar_4'))], style={'width': '50%'}),
+            ], style={'display': 'flex'})
+        ]),
 
-    html.Br(),
-    html.H3('Discrepancies Between Contract award and execution', style={'height': '10%', 'text-align': 'center'}),
-    html.Br(),
-    html.Div([
-        html.H4('Time and Money'),
-        dbc.Spinner(dcc.Graph(id='cpv_bar_diff'))
-    ], style={}),
+        html.Br(),
+        html.H3('Discrepancies Between Contract award and execution', style={'height': '10%', 'text-align': 'center'}),
+        html.Br(),
+        html.Div([
+            html.H4('Time and Money'),
+            dbc.Spinner(dcc.Graph(id='cpv_bar_diff'))
+        ], style={}),
 
-])
+    ])
 
 
 @app.callback(
@@ -191,6 +132,7 @@ layout = html.Div([
         Input('url', 'pathname')
     ]
 )
+@traced_callback
 def callbacks(none):
     return
 
@@ -211,6 +153,7 @@ def callbacks(none):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -240,6 +183,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -258,6 +202,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -276,6 +221,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -295,6 +241,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -314,6 +261,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -334,6 +282,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, cpv, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -354,6 +303,7 @@ def callbacks(n_clicks_1, cpv, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -373,6 +323,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -2,6 +2,7 @@ import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
 from app import app
+from backend.tracing import traced_callback
 import apps.dcc_functions as f
 import dash_bootstrap_components as dbc
 
@@ -91,6 +92,7 @@ layout = html.Div([
         Input('url', 'pathname')
     ]
 )
+@traced_callback
 def callbacks(none):
     return
 
@@ -111,6 +113,7 @@ def callbacks(none):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -141,6 +144,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -159,6 +163,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -177,6 +182,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -196,6 +202,7 @@ def callbacks(n_clicks_1, year, country_list):
         State('country_drop', 'value')
     ]
 )
+@traced_callback
 def callbacks(n_clicks_1, year, country_list):
     bot_year = year[0]
     top_year = year[1]
@@ -1,9 +1,12 @@
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+import functools
 import backend.queries   as u
+from backend.metrics import instrumented, record_error
 
 
+@instrumented('figure')
 def cpv_box(bot_year, top_year, country_list):
     try:
         boxes = u.ex1_cpv_box(bot_year, top_year, country_list)
@@ -16,10 +19,12 @@ def cpv_box(bot_year, top_year, country_list):
 
         return int(boxes[0]), int(boxes[1]), int(boxes[2]), int(boxes[3]), int(boxes[4])
 
-    except:
+    except Exception as e:
+        record_error(e)
         return ['-'] * 5  
 
 
+@instrumented('figure')
 def cpv_treemap(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex2_cpv_treemap(bot_year, top_year, country_list))
@@ -49,10 +54,12 @@ def cpv_treemap(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_bar_1(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex3_cpv_bar_1(bot_year, top_year, country_list))
@@ -74,10 +81,12 @@ def cpv_bar_1(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_bar_2(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex4_cpv_bar_2(bot_year, top_year, country_list))
@@ -100,10 +109,12 @@ def cpv_bar_2(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_map(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex7_cpv_map(bot_year, top_year, country_list))
@@ -150,10 +161,12 @@ def cpv_map(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_histogram(bot_year, top_year, country_list, cpv):
     try:
         df = pd.DataFrame(u.ex8_cpv_hist(bot_year, top_year, country_list, cpv))
@@ -180,10 +193,12 @@ def cpv_histogram(bot_year, top_year, country_list, cpv):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_bar_3(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex5_cpv_bar_3(bot_year, top_year, country_list))
@@ -206,10 +221,12 @@ def cpv_bar_3(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_bar_4(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex6_cpv_bar_4(bot_year, top_year, country_list))
@@ -233,10 +250,12 @@ def cpv_bar_4(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def cpv_bar_diff(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex9_cpv_bar_diff(bot_year, top_year, country_list))
@@ -270,10 +289,12 @@ def cpv_bar_diff(bot_year, top_year, country_list):
 
         return go.Figure(data=[data_1, data_2], layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def country_box(bot_year, top_year, country_list):
     try:
         boxes = u.ex10_country_box(bot_year, top_year, country_list)
@@ -286,11 +307,13 @@ def country_box(bot_year, top_year, country_list):
 
         return int(boxes[0]), int(boxes[1]), int(boxes[2]), int(boxes[3]), int(boxes[4])
 
-    except:
+    except Exception as e:
+        record_error(e)
         return ['-'] * 5  
 
 
 
+@instrumented('figure')
 def country_treemap(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex11_country_treemap(bot_year, top_year, country_list))
@@ -320,10 +343,12 @@ def country_treemap(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def country_bar_1(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex12_country_bar_1(bot_year, top_year, country_list))
@@ -349,10 +374,12 @@ def country_bar_1(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def country_bar_2(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex13_country_bar_2(bot_year, top_year, country_list))
@@ -376,10 +403,12 @@ def country_bar_2(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def country_map(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex14_country_map(bot_year, top_year, country_list))
@@ -428,10 +457,12 @@ def country_map(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def business_box(bot_year, top_year, country_list):
     try:
         boxes = u.ex15_business_box(bot_year, top_year, country_list)
@@ -444,11 +475,13 @@ def business_box(bot_year, top_year, country_list):
 
         return int(boxes[0]), int(boxes[1]), int(boxes[2]), int(boxes[3]), int(boxes[4])
 
-    except:
+    except Exception as e:
+        record_error(e)
         return ['-'] * 5  
 
 
 
+@instrumented('figure')
 def business_bar_1(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex16_business_bar_1(bot_year, top_year, country_list))
@@ -472,10 +505,12 @@ def business_bar_1(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def business_bar_2(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex17_business_bar_2(bot_year, top_year, country_list))
@@ -499,10 +534,12 @@ def business_bar_2(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def business_treemap(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex18_business_treemap(bot_year, top_year, country_list))
@@ -532,10 +569,12 @@ def business_treemap(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def business_map(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex19_business_map(bot_year, top_year, country_list))
@@ -586,10 +625,12 @@ def business_map(bot_year, top_year, country_list):
 
         return fig
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
+@instrumented('figure')
 def business_connection(bot_year, top_year, country_list):
     try:
         df = pd.DataFrame(u.ex20_business_connection(bot_year, top_year, country_list))
@@ -607,7 +648,8 @@ def business_connection(bot_year, top_year, country_list):
 
         return go.Figure(data=data, layout=layout)
 
-    except:
+    except Exception as e:
+        record_error(e)
         return gone_wrong()
 
 
@@ -626,3 +668,16 @@ def gone_wrong():
         )
 
     return go.Figure(data=data, layout=layout)
+
+
+# Figure builders measured by the memory mode of the performance evaluation (in the order of query_list),
+# the histogram for the CPV Division 50 like its query ex8_cpv_hist (named cpv_histogram in the run)
+figure_list = [
+    cpv_box, cpv_treemap, cpv_bar_1, cpv_bar_2,
+    cpv_bar_3, cpv_bar_4, cpv_map, functools.update_wrapper(functools.partial(cpv_histogram, cpv='50'), cpv_histogram),
+    cpv_bar_diff,
+    country_box, country_treemap, country_bar_1,
+    country_bar_2, country_map, business_box,
+    business_bar_1, business_bar_2, business_treemap,
+    business_map, business_connection
+]
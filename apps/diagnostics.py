@@ -0,0 +1,117 @@
+import time
+import dash_core_components as dcc
+import dash_html_components as html
+import plotly.graph_objects as go
+from dash.dependencies import Input, Output
+from app import app
+from backend.tracing import recent_traces
+from backend.monitoring import monitoring_stats, reply_sizes
+
+
+########################################################################################################################
+# Hidden page (/diagnostics, not in the navbar, served with DASHBOARD_DIAGNOSTICS=1) with the waterfall of the
+# recent callback traces and the MongoDB commands and connection pool seen by the driver
+
+span_colors = {'callback': '#003399', 'figure': '#ffcc00', 'query': '#5b8def', 'mongodb': '#2ca02c',
+               'encoding': '#d62728'}
+
+layout = html.Div([
+    html.H1('Diagnostics', style={'text-align': 'center', 'margin-top': '2%'}),
+    html.Div('Recent Dash callback requests, from the callback to its queries, figure builders and the response '
+             'encoding', style={'text-align': 'center'}),
+    dcc.Interval(id='traces-interval', n_intervals=0, interval=5000),
+    dcc.Dropdown(id='trace_drop', placeholder='Select a trace', style={'margin-top': '2%'}),
+    dcc.Graph(id='trace_waterfall'),
+    html.H3('MongoDB driver', style={'margin-top': '2%'}),
+    html.Div(id='driver-stats'),
+])
+
+command_columns = ['Command', 'Collection', 'Count', 'Failures', 'Slow', 'Mean (ms)', 'Max (ms)', 'Documents',
+                   'Reply (KB)']
+
+
+def depth(span, spans):
+    level = 0
+    while span['parent'] is not None:
+        span = spans[span['parent']]
+        level += 1
+    return level
+
+
+def waterfall(trace):
+    spans = trace['spans']
+
+    labels = [f"{'  ' * depth(span, spans)}{span['kind']}: {span['name']} ({span['id']})" for span in spans]
+    durations = [(span['seconds'] or 0) * 1000 for span in spans]
+
+    data = dict(type='bar',
+                orientation='h',
+                y=labels,
+                x=durations,
+                base=[span['start'] * 1000 for span in spans],
+                marker=dict(color=[span_colors.get(span['kind'], '#7f7f7f') for span in spans]),
+                text=[f"{duration:.1f} ms" for duration in durations],
+                hovertemplate='%{y}<br>start %{base:.1f} ms, %{x:.1f} ms<extra></extra>')
+
+    layout = dict(title=dict(text=f"{trace['name']} - {trace['seconds'] * 1000:.1f} ms (trace {trace['id']})", x=.5),
+                  xaxis=dict(title='ms since the request started'),
+                  yaxis=dict(autorange='reversed'),
+                  height=max(300, 30 * len(spans) + 150),
+                  margin=dict(l=300),
+                  paper_bgcolor='rgba(0,0,0,0)',
+                  plot_bgcolor='rgba(0,0,0,0)')
+
+    return go.Figure(data=data, layout=layout)
+
+
+@app.callback(
+    Output('trace_drop', 'options'),
+    [
+        Input('traces-interval', 'n_intervals')
+    ]
+)
+def update_traces(n):
+    options = []
+    for trace in recent_traces():
+        started = time.strftime('%H:%M:%S', time.localtime(trace['started']))
+        options.append(dict(label=f"{started} {trace['name']} ({trace['seconds'] * 1000:.1f} ms)", value=trace['id']))
+    return options
+
+
+@app.callback(
+    Output('trace_waterfall', 'figure'),
+    [
+        Input('trace_drop', 'value')
+    ]
+)
+def update_waterfall(trace_id):
+    trace = next((trace for trace in recent_traces() if trace['id'] == trace_id), None)
+    if trace is None:
+        return go.Figure()
+    return waterfall(trace)
+
+
+@app.callback(
+    Output('driver-stats', 'children'),
+    [
+        Input('traces-interval', 'n_intervals')
+    ]
+)
+def update_driver_stats(n):
+    stats = monitoring_stats()
+    pool = stats['pool']
+
+    rows = [html.Tr([html.Td(command['command']), html.Td(command['collection'] or ''), html.Td(command['count']),
+                     html.Td(command['failures']), html.Td(command['slow']), html.Td(f"{command['mean_ms']:.1f}"),
+                     html.Td(f"{command['max_seconds'] * 1000:.1f}"), html.Td(command['reply_documents']),
+                     html.Td(f"{command['reply_bytes'] / 1024:.1f}" if reply_sizes else '')])
+            for command in stats['commands']]
+
+    return [
+        html.Div(f"Connections created {pool['created']}, closed {pool['closed']}, in use {pool['in_use']} "
+                 f"(max {pool['max_in_use']}), check outs {pool['checked_out']}, failed {pool['checkout_failed']}, "
+                 f"wait mean {pool['mean_wait_ms']:.2f} ms, max {pool['max_wait_seconds'] * 1000:.2f} ms, "
+                 f"pool cleared {pool['cleared']}"),
+        html.Table([html.Thead(html.Tr([html.Th(column) for column in command_columns])), html.Tbody(rows)],
+                   className='table table-sm'),
+    ]
@@ -2,9 +2,18 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
-from app import app
-import base64
+from app import app, diagnostics_enabled
+import queue
+import time
 import backend.performance_evaluation as perf_eval
+from backend.uploads import all_uploads
+from backend.jobs import submit_ingest, all_jobs
+from backend.streaming import base64_chunks
+from apps.dcc_functions import figure_list
+from backend.cpu_profile import arm, capture_status, all_captures
+from apps.routes import output_name
+import backend.queries as queries
+import re
 
 layout = html.Div([
     html.Div([
@@ -27,10 +36,31 @@ layout = html.Div([
     html.Div([
         html.H1('Performance test'),
         html.Div('This will run all the dashboard queries sequentially and output the time taken by all queries'),
+        dcc.Checklist(id='eval-options', options=[
+            {'label': ' Benchmark (warm-up, repetitions with random filters, p50/p95/p99 and baseline comparison)',
+             'value': 'benchmark'},
+            {'label': ' Database profiler (server side time, planning, yields and bytes read per query)',
+             'value': 'profile'},
+            {'label': ' Memory (peak and retained Python memory of every query and figure builder, tracemalloc)',
+             'value': 'memory'}], value=[], style={'margin-top': '1%'}),
         html.Button('Start evaluation', id='buttonEval', style = {'margin-top': '2%'}),
         dcc.Interval(id="progress-interval", n_intervals=0, interval=2000, max_intervals=1000),
         dbc.Progress(id="progress", striped=True, animated=True, style={"height": "40px", 'margin-top': '2%'}),
+        html.Div(id='query-plans', style={'margin-top': '2%'}),
     ],style={'text-align': 'center', 'margin-top': '2%'}),
+
+    html.Hr(), html.Hr(), html.Hr(),
+    html.Div([
+        html.H1('CPU profile'),
+        html.Div('Runs the next call of a callback or query under cProfile, the collapsed stacks open in flamegraph.pl '
+                 'or speedscope'),
+        dcc.Dropdown(id='profile-target', placeholder='Callback or query to profile',
+                     style={'margin-top': '1%', 'text-align': 'left'}),
+        html.Button('Profile next call', id='profile-arm', style={'margin-top': '1%'}),
+        html.Div(id='profile-armed', style={'margin-top': '1%'}),
+        dcc.Interval(id='profile-interval', n_intervals=0, interval=5000),
+        html.Div(id='profile-captures', style={'margin-top': '2%'}),
+    ], style={'text-align': 'center', 'margin-top': '2%'}),
     
     html.Hr(), html.Hr(), html.Hr(),  
     html.H1('File Upload', style={'text-align': 'center'}),
@@ -57,17 +87,30 @@ layout = html.Div([
         multiple=False
     ),
     html.Div(id='output-data-upload'),
+
+    html.Div([
+        html.Div('Large files (JSON array or NDJSON) are sent in chunks, resumed after a lost connection and '
+                 'inserted while they arrive'),
+        html.Input(id='chunked-upload', type='file', multiple=True, accept='.json,.ndjson,.jsonl',
+                   style={'margin': '10px'}),
+        dcc.Interval(id='upload-interval', n_intervals=0, interval=2000),
+        html.Div(id='upload-progress'),
+        html.H3('Ingest jobs', style={'margin-top': '2%'}),
+        html.Div(id='jobs-status', style={'whiteSpace': 'pre-line'}),
+    ], style={'text-align': 'center', 'margin-top': '2%'}),
 ])
 
 def parse_contents(contents, filename, date):
     content_type, content_string = contents.split(',')
-    json_obj = base64.b64decode(content_string)
 
     try:
         if 'json' not in filename:
             raise Exception("Invalid data file")
         
-        (inserted_ids, processed_time) = perf_eval.insert_json(json_obj)
+        # Inserted by a background job, the request returns right away
+        job_id = submit_ingest(filename, base64_chunks(content_string))
+    except queue.Full:
+        return html.Div(['The ingest queue is full, try again once the running jobs finish'])
     except Exception as e:
         print(f'There was an error processing this file: {e}')
         return html.Div([
@@ -75,9 +118,8 @@ def parse_contents(contents, filename, date):
         ])
 
     return html.Div([
-        html.H6(f"Inserted ids {inserted_ids}"),
+        html.H6(f"Queued ingest job {job_id} for {filename}"),
         html.Hr(),  # horizontal line
-        html.H3(f"Insertion time: {processed_time:.3f} seconds!"),
 
     ])
 
@@ -103,19 +145,26 @@ def update_output_textarea_count(content, name, date):
               [State('upload-data', 'filename'),
                State('upload-data', 'last_modified')])
 def update_textarea_avg(list_of_contents, list_of_names, list_of_dates):
-    return f"Collection stats: {perf_eval.get_collection_stats()}"
+    return f"Collection stats: {perf_eval.get_collection_stats()}\nQuery cache: {perf_eval.get_cache_stats()}"
 
 @app.callback(
         Output("buttonEval", "disabled")
     ,[
         Input("buttonEval", "n_clicks")
+    ],[
+        State("eval-options", "value")
     ])
-def start_evaluation(n_clicks):
+def start_evaluation(n_clicks, options):
     if n_clicks is None:
         return False
 
     from threading import Thread
-    Thread(target=perf_eval.performance_evaluation).start()
+    if 'benchmark' in (options or []):
+        Thread(target=perf_eval.benchmark_evaluation).start()
+    else:
+        Thread(target=perf_eval.performance_evaluation, kwargs={'profile': 'profile' in (options or []),
+                                                                'memory': 'memory' in (options or []),
+                                                                'figures': figure_list}).start()
     return True
 
 @app.callback(
@@ -130,7 +179,159 @@ def update_progress(n):
     disabled = True if n == 50 else False
     try:
         with open(".query.state", 'r') as file:
-            data = file.read().split(":")
+            data = file.read().split(":", 1)
     except:
         data = (0, "Not started")
-    return data[0], data[1]
\ No newline at end of file
+    return data[0], data[1]
+
+@app.callback(Output('upload-progress', 'children'),
+              [Input('upload-interval', 'n_intervals')])
+def update_upload_progress(n):
+    children = []
+    for upload in all_uploads():
+        message = (f"{upload['filename']}: {upload['state']}, {upload['received'] / 1048576:.1f} of "
+                   f"{upload['size'] / 1048576:.1f} MB ({upload['bytes_per_sec'] / 1048576:.1f} MB/s), "
+                   f"{upload['documents']} documents inserted ({upload['docs_per_sec']:.0f} docs/sec)")
+        if upload['error']:
+            message += f" - {upload['error']}"
+        children += [html.Div(message),
+                     dbc.Progress(value=upload['percent'], striped=upload['state'] == 'receiving',
+                                  animated=upload['state'] == 'receiving', style={'margin-bottom': '1%'})]
+    return children
+
+@app.callback(Output('jobs-status', 'children'),
+              [Input('upload-interval', 'n_intervals')])
+def update_jobs_status(n):
+    lines = []
+    for job in reversed(all_jobs()):
+        line = (f"{job['id']} {job['name']}: {job['state']}, {job['documents']} documents "
+                f"in {job['seconds']:.1f}s ({job['docs_per_sec']:.0f} docs/sec)")
+        if job['error']:
+            line += f" - {job['error']}"
+        lines.append(line)
+    return '\n'.join(lines) or 'No ingest jobs'
+
+@app.callback(Output('profile-target', 'options'),
+              [Input('url', 'pathname')])
+def update_profile_targets(pathname):
+    callbacks = sorted(output_name(output) for output in app.callback_map)
+    query_names = sorted((name for name in dir(queries) if re.match(r'ex\d+_', name)),
+                         key=lambda name: int(re.match(r'ex(\d+)_', name).group(1)))
+    return ([{'label': f'Callback {name}', 'value': name} for name in callbacks] +
+            [{'label': f'Query {name}', 'value': name} for name in query_names])
+
+@app.callback(Output('profile-armed', 'children'),
+              [Input('profile-arm', 'n_clicks')],
+              [State('profile-target', 'value')])
+def arm_profile(n_clicks, target):
+    if n_clicks is None or not target:
+        return ''
+    if not diagnostics_enabled:
+        return 'Profiling is disabled, set DASHBOARD_DIAGNOSTICS=1 to enable it'
+    try:
+        arm(target)
+    except ValueError as e:
+        return str(e)
+    return f"The next call of {target} will be profiled"
+
+capture_columns = ['Function', 'Calls', 'Own time (s)', 'Cumulative time (s)']
+
+@app.callback(Output('profile-captures', 'children'),
+              [Input('profile-interval', 'n_intervals')])
+def update_profile_captures(n):
+    status = capture_status()
+    children = [html.Div(f"Armed: {status['armed'] or 'nothing'}, running: {status['running'] or 'nothing'}, "
+                         f"next capture allowed in {status['next_capture_seconds']:.0f} s")]
+
+    captures = all_captures()
+    for capture in captures:
+        children.append(html.Div([
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture['started']))} {capture['target']} "
+            f"({capture['seconds']:.3f} s, {capture['calls']} calls) ",
+            html.A('pstats', href=f"/profiles/{capture['id']}.pstats"), ' ',
+            html.A('collapsed stacks', href=f"/profiles/{capture['id']}.collapsed"),
+        ]))
+
+    if captures:
+        rows = [html.Tr([html.Td(function['function']), html.Td(function['calls']),
+                         html.Td(f"{function['tottime']:.4f}"), html.Td(f"{function['cumtime']:.4f}")])
+                for function in captures[0]['top']]
+        children += [
+            html.H4(f"Slowest functions of {captures[0]['target']}", style={'margin-top': '2%'}),
+            html.Table([html.Thead(html.Tr([html.Th(column) for column in capture_columns])), html.Tbody(rows)],
+                       className='table table-sm'),
+        ]
+
+    return children
+
+profile_columns = ['Query', 'Operations', 'Server time (ms)', 'Planning (ms)', 'Yields', 'Bytes read',
+                   'Docs examined', 'Keys examined', 'Returned']
+
+memory_columns = ['Query or figure', 'Peak (MB)', 'Retained (KB)', 'Result documents', 'Result (KB)',
+                  'Top allocation sites']
+
+def memory_row(name, usage, error):
+    if usage is None:
+        return html.Tr([html.Td(name), html.Td(f"Not measured: {error}" if error else '', colSpan=5)])
+    sites = '; '.join(f"{'/'.join(site['site'].split('/')[-2:])} {site['bytes'] / 1024:.0f} KB"
+                      for site in usage['sites'][:3])
+    return html.Tr([html.Td(value) for value in (
+        name, f"{usage['peak_bytes'] / 1048576:.2f}", f"{usage['retained_bytes'] / 1024:.1f}",
+        usage['result_documents'] if usage['result_documents'] is not None else '',
+        f"{usage['result_bytes'] / 1024:.1f}" if usage['result_bytes'] is not None else '', sites)])
+
+plan_columns = ['Query', 'Time (s)', 'Collection', 'Plan', 'Indexes', 'Docs examined', 'Keys examined', 'Returned',
+                'Warnings']
+
+@app.callback(Output('query-plans', 'children'),
+              [Input('progress-interval', 'n_intervals')])
+def update_query_plans(n):
+    try:
+        run = perf_eval.get_latest_run()
+    except Exception as e:
+        return f"Could not read the query plans: {e}"
+    if run is None:
+        return ''
+
+    rows = []
+    for query in run['queries']:
+        for plan in query['plans'] or [{}]:
+            warnings = [name for name, flag in (('COLLSCAN', 'collscan'), ('in-memory sort', 'inMemorySort'),
+                                                ('spilled to disk', 'spilled')) if plan.get(flag)]
+            if query['explain_error']:
+                warnings.append(f"explain failed: {query['explain_error']}")
+            rows.append(html.Tr([html.Td(value) for value in (
+                query['query'], f"{query['seconds']:.3f}", plan.get('collection', ''), plan.get('winningPlan', ''),
+                ', '.join(plan.get('indexes', [])), plan.get('docsExamined', ''), plan.get('keysExamined', ''),
+                plan.get('nReturned', ''), ', '.join(warnings))]))
+
+    children = [
+        html.H4(f"Query plans of the run started {run['started']:%Y-%m-%d %H:%M:%S} ({run['state']})"),
+        html.Table([html.Thead(html.Tr([html.Th(column) for column in plan_columns])), html.Tbody(rows)],
+                   className='table table-sm'),
+    ]
+
+    measured = [(query['query'], query.get('memory'), query.get('memory_error')) for query in run['queries']
+                if query.get('memory') or query.get('memory_error')]
+    measured += [(figure['figure'], figure['memory'], figure['memory_error']) for figure in run.get('figures', [])]
+    if measured:
+        children += [
+            html.H4('Python memory (tracemalloc)'),
+            html.Table([html.Thead(html.Tr([html.Th(column) for column in memory_columns])),
+                        html.Tbody([memory_row(*values) for values in measured])], className='table table-sm'),
+        ]
+
+    if run.get('profile_error'):
+        children.append(html.Div(f"Could not read the database profiler: {run['profile_error']}"))
+    if run.get('profile'):
+        profile_rows = [html.Tr([html.Td(value) for value in (
+            query, stats['operations'], stats['millis'], f"{stats['planningMillis']:.1f}", stats['yields'],
+            stats['bytesRead'], stats['docsExamined'], stats['keysExamined'], stats['nreturned'])])
+            for query, stats in run['profile'].items()]
+        children += [
+            html.H4('Server side profile (system.profile)'),
+            html.Table([html.Thead(html.Tr([html.Th(column) for column in profile_columns])),
+                        html.Tbody(profile_rows)], className='table table-sm'),
+        ]
+
+    return html.Div(children)
@@ -0,0 +1,158 @@
+import os
+import time
+import queue
+from flask import Response, g, jsonify, request, send_file
+from app import app, diagnostics_enabled
+from backend.metrics import inc, observe, render
+from backend.tracing import start_trace, end_trace, add_span
+from backend.uploads import receive_chunk, upload_status, all_uploads
+from backend.jobs import get_job, all_jobs
+from backend.monitoring import monitoring_stats
+from backend.cpu_profile import arm, disarm, capture_status, all_captures, capture_file, start_capture, \
+    finish_capture
+
+########################################################################################################################
+# Plain Flask routes on the Dash server, chunked uploads (used by assets/upload.js), background job status,
+# the metrics of the queries, figure builders, callbacks and MongoDB driver, and the CPU profiles
+server = app.server
+
+
+@server.route('/upload/<upload_id>', methods=['POST'])
+def upload_chunk(upload_id):
+    """
+    Receives a chunk (raw request body) of a file starting at byte ?offset, ?final=1 marks the last chunk
+
+    200 with the upload status when the chunk was appended, 409 with the status when the offset is not the
+    one expected (the client resends from status['received']), 400 for invalid uploads, 503 when too many
+    uploads are already being ingested (the client resends the first chunk later)
+    """
+    try:
+        accepted, status = receive_chunk(upload_id,
+                                         request.args.get('filename'),
+                                         request.args.get('size', 0, type=int),
+                                         request.args.get('offset', 0, type=int),
+                                         request.get_data(cache=False),
+                                         request.args.get('final') == '1')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except queue.Full:
+        return jsonify({'error': 'Too many uploads are being ingested, the chunk is resent later'}), 503
+
+    return jsonify(status), 200 if accepted else 409
+
+
+@server.route('/upload/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    status = upload_status(upload_id)
+    if status is None:
+        return jsonify({'id': upload_id, 'received': 0, 'state': 'unknown'}), 404
+    return jsonify(status)
+
+
+@server.route('/uploads', methods=['GET'])
+def get_uploads():
+    return jsonify(all_uploads())
+
+
+@server.route('/jobs', methods=['GET'])
+def get_jobs():
+    return jsonify(all_jobs())
+
+
+@server.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    status = get_job(job_id)
+    if status is None:
+        return jsonify({'id': job_id, 'state': 'unknown'}), 404
+    return jsonify(status)
+
+
+def output_name(output):
+    """
+    Returns the name of a Dash callback output ('box_1.children' or 'box_1,box_2' for multiple outputs)
+    """
+    if output.startswith('..'):
+        return ','.join(item.rsplit('.', 1)[0] for item in output[2:-2].split('...'))
+    return output
+
+
+def callback_output():
+    return output_name((request.get_json(silent=True) or {}).get('output', 'unknown'))
+
+
+@server.before_request
+def start_callback_metrics():
+    if request.path.endswith('/_dash-update-component'):
+        g.callback_output = callback_output()
+        g.callback_start = time.perf_counter()
+        inc('dashboard_callback_in_flight', g.callback_output)
+        g.trace, g.trace_token = start_trace(g.callback_output)
+        # Armed from the home page (POST /profiles), or ?profile=1 on the callback request itself
+        g.capture = start_capture(g.callback_output, diagnostics_enabled and request.args.get('profile') == '1')
+
+
+@server.after_request
+def record_callback_response(response):
+    if 'callback_output' in g:
+        if response.status_code >= 400:
+            inc('dashboard_callback_errors_total', g.callback_output)
+        if response.content_length is not None:
+            observe('dashboard_callback_response_bytes', g.callback_output, response.content_length)
+        # Dash serialises the figures to JSON between the return of the callback and here
+        if 'callback_end' in g.trace:
+            add_span('encoding', 'response JSON', g.trace['callback_end'], time.perf_counter())
+        g.trace['status'] = response.status_code
+    return response
+
+
+@server.teardown_request
+def finish_callback_metrics(error):
+    if 'callback_output' in g:
+        if error is not None:
+            inc('dashboard_callback_errors_total', g.callback_output)
+        observe('dashboard_callback_seconds', g.callback_output, time.perf_counter() - g.callback_start)
+        inc('dashboard_callback_in_flight', g.callback_output, -1)
+        end_trace(g.trace, g.trace_token, error=repr(error) if error is not None else None)
+        finish_capture(g.capture)
+
+
+@server.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+@server.route('/monitoring', methods=['GET'])
+def monitoring():
+    return jsonify(monitoring_stats(request.args.get('recent', 20, type=int)))
+
+
+@server.route('/profiles', methods=['GET'])
+def get_profiles():
+    return jsonify({'status': capture_status(), 'captures': all_captures()})
+
+
+@server.route('/profiles', methods=['POST'])
+def arm_profile():
+    """
+    Profiles the next call of ?target (callback output ids or exN query name), ?target= disarms,
+    403 unless DASHBOARD_DIAGNOSTICS=1
+    """
+    if not diagnostics_enabled:
+        return jsonify({'error': 'Profiling is disabled, set DASHBOARD_DIAGNOSTICS=1 to enable it'}), 403
+    target = request.args.get('target')
+    if not target:
+        disarm()
+        return jsonify(capture_status())
+    try:
+        arm(target)
+    except ValueError as e:
+        return jsonify({'error': str(e), **capture_status()}), 429
+    return jsonify(capture_status())
+
+
+@server.route('/profiles/<capture_id>.<extension>', methods=['GET'])
+def get_profile_file(capture_id, extension):
+    path = capture_file(capture_id, extension)
+    if path is None:
+        return jsonify({'error': f'Unknown profile {capture_id}.{extension}'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True)
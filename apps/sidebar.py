@@ -1,51 +1,16 @@
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-
-
-countries =[
-    ['MK', 'North Macedonia'],
-    ['LT', 'Lithuania'],
-    ['SI', 'Slovenia'],
-    ['CY', 'Cyprus'],
-    ['NL', 'Netherlands'],
-    ['LI', 'Liechtenstein'],
-    ['HR', 'Croatia'],
-    ['AT', 'Austria'],
-    ['RO', 'Romania'],
-    ['ES', 'Spain'],
-    ['SE', 'Sweden'],
-    ['DK', 'Denmark'],
-    ['FI', 'Finland'],
-    ['PL', 'Poland'],
-    ['DE', 'Germany'],
-    ['GR', 'Greece'],
-    ['FR', 'France'],
-    ['CH', 'Switzerland'],
-    ['BG', 'Bulgaria'],
-    ['HU', 'Hungary'],
-    ['BE', 'Belgium'],
-    ['SK', 'Slovakia'],
-    ['NO', 'Norway'],
-    ['IT', 'Italy'],
-    ['IS', 'Iceland'],
-    ['EE', 'Estonia'],
-    ['LV', 'Latvia'],
-    ['CZ', 'Czechia'],
-    ['MT', 'Malta'],
-    ['LU', 'Luxembourg'],
-    ['UK', 'United Kingdom'],
-    ['IE', 'Ireland'],
-    ['PT', 'Portugal']
-]
-
-country_options = [dict(label=country[1], value=country[0]) for country in countries]
+from backend.queries import countries as country_codes
+from backend.dimensions import country_names
 
 
 image_filename = 'assets/eu_icon.png'
 
 
 def render_sidebar():
+    countries = [[code, name] for code, name in country_names().items() if code in country_codes]
+
     sidebar = html.Div(
         [
             html.Hr(),
@@ -72,7 +37,7 @@ def render_sidebar():
             html.H2('Country Choice', style={'color': 'white'}),
             dcc.Dropdown(
                 id='country_drop',
-                options=country_options,
+                options=[dict(label=country[1], value=country[0]) for country in countries],
                 value=[country[0] for country in countries],
                 multi=True,
                 style={'max-height': '400px', 'overflow-y': 'scroll', 'background-color':'#003399', 'color':'#f9f9f9'}
@@ -0,0 +1,86 @@
+// Chunked, resumable uploads of the files selected in the #chunked-upload input (see apps/routes.py)
+var uploadChunkSize = 4 * 1024 * 1024;
+var uploadRetries = 5;
+
+function uploadId(file) {
+  var key = file.name + '-' + file.size + '-' + file.lastModified;
+  var hash = 0;
+  for (var i = 0; i < key.length; i++) {
+    hash = ((hash << 5) - hash + key.charCodeAt(i)) | 0;
+  }
+  return file.name.replace(/[^A-Za-z0-9_-]/g, '_').slice(0, 40) + '-' + (hash >>> 0).toString(16);
+}
+
+function sleep(ms) {
+  return new Promise(function(resolve) { setTimeout(resolve, ms); });
+}
+
+async function uploadOffset(id) {
+  // Bytes the server already has, an upload interrupted earlier resumes from there
+  var response = await fetch('/upload/' + id);
+  if (response.status == 404) {
+    return 0;
+  }
+  var status = await response.json();
+  return status.state == 'receiving' ? status.received : null;
+}
+
+async function uploadFile(file) {
+  var id = uploadId(file);
+  var offset = await uploadOffset(id);
+  var failures = 0;
+
+  if (offset === null) {
+    // The file was already uploaded (or failed), selecting it again is a new upload
+    id = uploadId(file) + '-' + Date.now().toString(36);
+    offset = 0;
+  }
+
+  while (offset !== null && offset < file.size) {
+    var end = Math.min(offset + uploadChunkSize, file.size);
+    var query = '?filename=' + encodeURIComponent(file.name) + '&size=' + file.size +
+                '&offset=' + offset + '&final=' + (end == file.size ? '1' : '0');
+    try {
+      var response = await fetch('/upload/' + id + query, {method: 'POST', body: file.slice(offset, end)});
+      var status = await response.json();
+      if (response.status == 400) {
+        console.error('Upload of ' + file.name + ' failed: ' + status.error);
+        return;
+      }
+      if (response.status == 503) {
+        // Too many uploads are being ingested, the chunk is resent after the backoff below
+        throw new Error(status.error);
+      }
+      if (status.state == 'unknown') {
+        // The server restarted or dropped the idle upload, it is sent again from the start
+        console.warn('Upload of ' + file.name + ' restarted: ' + status.error);
+        offset = 0;
+        continue;
+      }
+      if (status.state != 'receiving') {
+        if (status.state == 'failed') {
+          console.error('Upload of ' + file.name + ' failed: ' + status.error);
+        }
+        return;
+      }
+      offset = status.received;
+      failures = 0;
+    } catch (error) {
+      failures += 1;
+      if (failures > uploadRetries) {
+        console.error('Upload of ' + file.name + ' failed: ' + error);
+        return;
+      }
+      await sleep(1000 * failures);
+      offset = await uploadOffset(id).catch(function() { return offset; });
+    }
+  }
+}
+
+document.addEventListener('change', function(event) {
+  if (event.target.id != 'chunked-upload') {
+    return;
+  }
+  Array.from(event.target.files).forEach(uploadFile);
+  event.target.value = '';
+});
@@ -1,11 +1,84 @@
+import os
 from pymongo import MongoClient
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from backend.monitoring import listeners
 
-host="rhea.isegi.unl.pt"
-port="27017"
-user="mongo_classes_rhea"
-password="bW9uZ29fY2xhc3Nlc19yaGVh"
-protocol="mongodb"
+########################################################################################################################
+# Connection settings, MONGO_URL replaces the host, port and credentials
+host = os.environ.get('MONGO_HOST', "rhea.isegi.unl.pt")
+port = os.environ.get('MONGO_PORT', "27017")
+user = os.environ.get('MONGO_USER', "mongo_classes_rhea")
+password = os.environ.get('MONGO_PASSWORD', "bW9uZ29fY2xhc3Nlc19yaGVh")
+protocol = os.environ.get('MONGO_PROTOCOL', "mongodb")
+url = os.environ.get('MONGO_URL', f"{protocol}://{user}:{password}@{host}:{port}")
+database = os.environ.get('MONGO_DATABASE', 'contracts')
 
-client = MongoClient(f"{protocol}://{user}:{password}@{host}:{port}")
-db = client.contracts
-eu = db.eu
\ No newline at end of file
+# Connections kept open to each member and the most opened, empty keeps the driver defaults (0 and 100)
+min_pool_size = os.environ.get('MONGO_MIN_POOL_SIZE')
+max_pool_size = os.environ.get('MONGO_MAX_POOL_SIZE')
+# Milliseconds a thread waits for a connection of a full pool before failing, empty waits forever
+wait_queue_timeout = os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS')
+# 'zstd,snappy' needs the zstandard and python-snappy packages, the server picks the first it supports
+compressors = os.environ.get('MONGO_COMPRESSORS', '')
+
+# Read-only analytics (backend/queries.py, backend/pairs.py) read with these settings when they are set
+# (MONGO_READ_PREFERENCE=secondaryPreferred reads from the secondaries when there are any), writes and every
+# other read stay on the primary, unset ones keep the driver defaults (the primary, local read concern)
+read_preference = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+max_staleness = os.environ.get('MONGO_MAX_STALENESS_SECONDS')
+read_concern = os.environ.get('MONGO_READ_CONCERN')
+
+read_preferences = {'primary': Primary, 'primaryPreferred': PrimaryPreferred, 'secondary': Secondary,
+                    'secondaryPreferred': SecondaryPreferred, 'nearest': Nearest}
+
+
+def analytics_read_preference():
+    mode = read_preferences[read_preference]
+    return mode(max_staleness=int(max_staleness)) if max_staleness and mode is not Primary else mode()
+
+
+# Options left unset keep the driver defaults, pymongo rejects None for some of them
+client_options = {}
+if min_pool_size:
+    client_options['minPoolSize'] = int(min_pool_size)
+if max_pool_size:
+    client_options['maxPoolSize'] = int(max_pool_size)
+if wait_queue_timeout:
+    client_options['waitQueueTimeoutMS'] = int(wait_queue_timeout)
+if compressors:
+    client_options['compressors'] = compressors
+
+# connect=False, the connections are opened by the first command (or warm_pool) and not at import
+client = MongoClient(url, connect=False, event_listeners=listeners, **client_options)
+db = client[database]
+eu = db.eu
+rollup = db.eu_rollup
+business_rollup = db.eu_business_rollup
+pairs = db.eu_pairs
+migrations = db.migrations
+performance_runs = db.performance_runs
+
+analytics_options = {}
+if read_preference != 'primary':
+    analytics_options['read_preference'] = analytics_read_preference()
+if read_concern:
+    analytics_options['read_concern'] = ReadConcern(read_concern)
+
+analytics = client.get_database(database, **analytics_options)
+eu_reads = analytics.eu
+rollup_reads = analytics.eu_rollup
+business_rollup_reads = analytics.eu_business_rollup
+pairs_reads = analytics.eu_pairs
+
+
+def warm_pool():
+    """
+    Connects to the primary and to a member of the analytics read preference before the first request,
+    the driver then keeps minPoolSize connections open to each member
+    """
+    db.command('ping')
+    analytics.command('ping', read_preference=analytics.read_preference)
+    print(f"MongoDB pool ready ({read_preference} analytics reads, {client.options.pool_options.min_pool_size}-"
+          f"{client.options.pool_options.max_pool_size} connections{', ' + compressors if compressors else ''})",
+          flush=True)
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime
+from backend.queries import query_list, countries
+from backend.cache import bypass
+
+########################################################################################################################
+# Repeated runs of query_list over seeded random filters, latency percentiles and comparison to a baseline report
+repetitions = int(os.environ.get('BENCHMARK_REPETITIONS', 20))
+warmup = int(os.environ.get('BENCHMARK_WARMUP', 2))
+seed = int(os.environ.get('BENCHMARK_SEED', 42))
+
+report_file = os.environ.get('BENCHMARK_REPORT', 'benchmark_report.json')
+baseline_file = os.environ.get('BENCHMARK_BASELINE', 'benchmark_baseline.json')
+
+# A query regresses when a percentile is threshold times the baseline and at least min_delta seconds slower
+threshold = float(os.environ.get('BENCHMARK_THRESHOLD', 1.2))
+min_delta = float(os.environ.get('BENCHMARK_MIN_DELTA', 0.005))
+
+first_year, last_year = 2008, 2020
+percentiles = [50, 95, 99]
+
+
+def random_filters(count, seed=seed):
+    """
+    Returns count random (bot_year, top_year, country_list) filters, the same ones for the same seed
+    """
+    rng = random.Random(seed)
+    filters = []
+
+    for _ in range(count):
+        bot_year = rng.randint(first_year, last_year)
+        top_year = rng.randint(bot_year, last_year)
+        country_list = sorted(rng.sample(countries, rng.randint(1, len(countries))))
+        filters.append((bot_year, top_year, country_list))
+
+    return filters
+
+
+def percentile(latencies, p):
+    """
+    Nearest rank percentile of a sorted list
+    """
+    return latencies[max(math.ceil(p / 100 * len(latencies)) - 1, 0)]
+
+
+def summarise(latencies, errors):
+    latencies = sorted(latencies)
+    summary = {'runs': len(latencies), 'errors': errors}
+
+    if latencies:
+        summary.update({f'p{p}': percentile(latencies, p) for p in percentiles})
+        summary.update({'mean': statistics.mean(latencies),
+                        'stdev': statistics.stdev(latencies) if len(latencies) > 1 else 0.0,
+                        'min': latencies[0], 'max': latencies[-1]})
+
+    return summary
+
+
+def run_benchmark(repetitions=repetitions, warmup=warmup, seed=seed, use_cache=False, progress=None):
+    """
+    Runs every function of query_list warmup times (not measured) and then repetitions times with random filters
+
+    The query result cache is bypassed unless use_cache, progress(percent, message) is called before each query
+
+    Expected Output (dict):
+    {created: iso date, seed, repetitions, warmup, use_cache,
+     queries: {query name: {runs, errors, p50, p95, p99, mean, stdev, min, max}, ....}}
+    """
+    filters = random_filters(repetitions, seed)
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'seed': seed, 'repetitions': repetitions,
+              'warmup': warmup, 'use_cache': use_cache, 'queries': {}}
+
+    for num, fn in enumerate(query_list):
+        if progress is not None:
+            progress(num / len(query_list) * 100, f"Benchmarking {fn.__name__}")
+
+        latencies, errors = [], 0
+
+        for run, (bot_year, top_year, country_list) in enumerate(filters[:1] * warmup + filters):
+            start = time.perf_counter()
+            try:
+                if use_cache:
+                    fn(bot_year, top_year, country_list)
+                else:
+                    with bypass():
+                        fn(bot_year, top_year, country_list)
+            except Exception as e:
+                if run >= warmup:
+                    errors += 1
+                print(f"{fn.__name__}{(bot_year, top_year)} failed: {e}", flush=True)
+                continue
+            if run >= warmup:
+                latencies.append(time.perf_counter() - start)
+
+        report['queries'][fn.__name__] = summarise(latencies, errors)
+        summary = report['queries'][fn.__name__]
+        print(f"{fn.__name__}: " + ', '.join(f"p{p} {summary.get(f'p{p}', 0) * 1000:.1f}ms" for p in percentiles)
+              + f", {errors} errors", flush=True)
+
+    return report
+
+
+def compare(report, baseline, threshold=threshold, min_delta=min_delta):
+    """
+    Returns the regressions of report against baseline, queries missing from any of them are skipped
+
+    Expected Output (list of documents):
+    [{query: query name, metric: 'p50', baseline: seconds, current: seconds, ratio: current / baseline}, ....]
+    """
+    regressions = []
+
+    for name, summary in report['queries'].items():
+        reference = baseline.get('queries', {}).get(name)
+        if reference is None:
+            continue
+
+        if summary['errors'] > reference.get('errors', 0):
+            regressions.append({'query': name, 'metric': 'errors', 'baseline': reference.get('errors', 0),
+                                'current': summary['errors'], 'ratio': None})
+
+        for metric in [f'p{p}' for p in percentiles]:
+            if metric not in summary or metric not in reference:
+                continue
+            current, previous = summary[metric], reference[metric]
+            if current > previous * threshold and current - previous > min_delta:
+                regressions.append({'query': name, 'metric': metric, 'baseline': previous, 'current': current,
+                                    'ratio': current / previous if previous else None})
+
+    return regressions
+
+
+def save_report(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def load_report(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def benchmark(repetitions=repetitions, warmup=warmup, seed=seed, use_cache=False, output=report_file,
+              baseline=baseline_file, save_baseline=False, progress=None):
+    """
+    Runs the benchmark, saves the JSON report to output and compares it with the baseline file when it exists
+
+    The report holds the regressions found ('regressions', None without baseline)
+    """
+    report = run_benchmark(repetitions, warmup, seed, use_cache, progress)
+
+    report['regressions'] = None
+    if baseline and os.path.exists(baseline) and not save_baseline:
+        report['baseline'] = baseline
+        report['regressions'] = compare(report, load_report(baseline))
+        for regression in report['regressions']:
+            print(f"Regression {regression['query']} {regression['metric']}: {regression['baseline']} -> "
+                  f"{regression['current']}", flush=True)
+
+    if output:
+        save_report(report, output)
+    if save_baseline and baseline:
+        save_report(report, baseline)
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard queries (query_list)')
+    parser.add_argument('--repetitions', type=int, default=repetitions)
+    parser.add_argument('--warmup', type=int, default=warmup)
+    parser.add_argument('--seed', type=int, default=seed)
+    parser.add_argument('--use-cache', action='store_true', help='measure through the query result cache')
+    parser.add_argument('--output', default=report_file, help='JSON report file')
+    parser.add_argument('--baseline', default=baseline_file, help='baseline report to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    args = parser.parse_args()
+
+    result = benchmark(args.repetitions, args.warmup, args.seed, args.use_cache, args.output, args.baseline,
+                       args.save_baseline)
+
+    sys.exit(1 if result['regressions'] else 0)
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+from backend.DB import eu
+from backend.ingest import derive
+from backend.rollups import update_rollups
+from backend.cache import invalidate
+
+########################################################################################################################
+# Bulk back-loads, batches are written unordered by a pool of threads (each one on its own pooled connection)
+workers = int(os.environ.get('BULK_WORKERS', 4))
+batch_size = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+write_concern = os.environ.get('BULK_WRITE_CONCERN', '1')
+journal = os.environ.get('BULK_JOURNAL', '').lower() in ('1', 'true', 'yes')
+
+# Only the first errors are kept in the report, all of them are counted
+max_errors = 100
+
+
+def write_concern_options(w=None, j=None):
+    w = write_concern if w is None else w
+    j = journal if j is None else j
+    return WriteConcern(w=int(w) if str(w).isdigit() else w, j=j or None)
+
+
+def write_batch(collection, number, batch):
+    """
+    Inserts a batch unordered, the documents that failed are reported instead of raised
+
+    Expected Output (tuple):
+    (inserted documents, [{batch: number, index: position in the batch, code: error code, message: error}, ....])
+    """
+    batch = [derive(contract) for contract in batch]
+
+    try:
+        collection.insert_many(batch, ordered=False)
+        errors = []
+    except BulkWriteError as e:
+        errors = [{'batch': number, 'index': error['index'], 'code': error.get('code'), 'message': error.get('errmsg')}
+                  for error in e.details.get('writeErrors', [])]
+        if e.details.get('writeConcernErrors'):
+            errors += [{'batch': number, 'index': None, 'code': error.get('code'), 'message': error.get('errmsg')}
+                       for error in e.details['writeConcernErrors']]
+    except PyMongoError as e:
+        # Nothing is known about the documents of the batch, report them all as failed
+        return [], [{'batch': number, 'index': index, 'code': getattr(e, 'code', None), 'message': str(e)}
+                    for index in range(len(batch))]
+
+    failed = {error['index'] for error in errors}
+    inserted = [document for index, document in enumerate(batch) if index not in failed]
+
+    return inserted, errors
+
+
+def parallel_insert(documents, size=None, threads=None, w=None, j=None):
+    """
+    Inserts an iterable of contracts in batches written concurrently by threads, like insert_operation
+    (derived fields, rollups and cache invalidation) but without stopping at the first error
+
+    At most 2 batches per thread are held in memory, documents can be a generator over a large file.
+    The rollups are updated by the calling thread as batches finish, concurrent upserts of the same rollup
+    key would race each other.
+
+    Expected Output (dict):
+    {documents: int, inserted: int, failed: int, batches: int, seconds: float, docs_per_sec: float,
+     errors: [{batch, index, code, message}, ....]}
+    """
+    size = size or batch_size
+    threads = threads or workers
+    collection = eu.with_options(write_concern=write_concern_options(w, j))
+
+    report = {'documents': 0, 'inserted': 0, 'failed': 0, 'batches': 0, 'seconds': 0.0, 'docs_per_sec': 0.0,
+              'errors': []}
+    start = time.time()
+    documents = iter(documents)
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            number, length = pending.pop(future)
+            try:
+                inserted, errors = future.result()
+            except Exception as e:
+                inserted, errors = [], [{'batch': number, 'index': None, 'code': None, 'message': str(e)}]
+
+            # The documents of the batch are in eu whatever happens here, a failure is reported with the batch
+            # (rebuild_rollups() brings the rollups back in line) and the next batches go on
+            for step in (update_rollups, invalidate):
+                try:
+                    step(inserted)
+                except Exception as e:
+                    errors = errors + [{'batch': number, 'index': None, 'code': getattr(e, 'code', None),
+                                        'message': f'{step.__name__} failed: {e}'}]
+
+            report['inserted'] += len(inserted)
+            report['failed'] += length - len(inserted)
+            report['errors'] += errors[:max_errors - len(report['errors'])]
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            batch = list(islice(documents, size))
+            if not batch:
+                break
+
+            if len(pending) >= 2 * threads:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            pending[executor.submit(write_batch, collection, report['batches'], batch)] = (report['batches'], len(batch))
+            report['batches'] += 1
+            report['documents'] += len(batch)
+
+        collect(wait(pending)[0])
+
+    report['seconds'] = time.time() - start
+    report['docs_per_sec'] = report['inserted'] / report['seconds'] if report['seconds'] else 0.0
+
+    print(f"Inserted {report['inserted']} of {report['documents']} documents in {report['batches']} batches "
+          f"({report['seconds']:.1f}s, {report['docs_per_sec']:.0f} docs/sec, {report['failed']} failed)", flush=True)
+
+    return report
+
+
+if __name__ == '__main__':
+    from backend.streaming import iter_documents, read_chunks
+
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as file:
+            parallel_insert(iter_documents(read_chunks(file)))
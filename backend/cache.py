@@ -0,0 +1,192 @@
+import os
+import time
+import pickle
+import inspect
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import RLock, local
+from backend.pipelines import capturing, primary_reads
+from backend.DB import read_preference
+from backend import singleflight
+
+########################################################################################################################
+# In-process cache of the query results, LRU bounded by the pickled size of the results
+max_bytes = int(os.environ.get('QUERY_CACHE_BYTES', 64 * 1024 * 1024))
+
+# The queries read from the secondaries (MONGO_READ_PREFERENCE), which may not have the latest inserts yet:
+# results computed within primary_seconds of an invalidation are read from the primary, the others expire
+# after secondary_ttl seconds so a lagging secondary cannot keep a stale result cached until the next insert
+primary_seconds = float(os.environ.get('QUERY_CACHE_PRIMARY_SECONDS', 60))
+secondary_ttl = float(os.environ.get('QUERY_CACHE_SECONDARY_TTL', 300))
+secondary_reads = read_preference != 'primary'
+
+entries = OrderedDict()
+lock = RLock()
+state = local()
+
+# Bumped by every insert, a result computed while the generation changed is not stored
+generation = 0
+invalidated_at = 0.0
+
+stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'expirations': 0, 'bytes': 0}
+
+
+def canonical(value):
+    """
+    Returns a hashable version of a query argument, the country list is sorted and frozen
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(set(value), key=str))
+    return value
+
+
+def cache_key(fn, signature, args, kwargs):
+    """
+    Returns the cache key (function name and canonical arguments) and the (bot_year, top_year, countries) filter
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = bound.arguments
+
+    key = (fn.__name__,) + tuple((name, canonical(value)) for name, value in arguments.items())
+
+    filter_ = None
+    if {'bot_year', 'top_year', 'country_list'} <= set(arguments):
+        filter_ = (arguments['bot_year'], arguments['top_year'], frozenset(arguments['country_list']))
+
+    return key, filter_
+
+
+def inserted_keys(documents):
+    return {(document.get('YEAR'), document.get('ISO_COUNTRY_CODE')) for document in documents}
+
+
+def overlaps(filter_, inserted):
+    """
+    True when any inserted (year, country) is inside the (bot_year, top_year, countries) filter
+    """
+    if filter_ is None:
+        return True
+
+    bot_year, top_year, country_list = filter_
+
+    for year, country in inserted:
+        if country not in country_list:
+            continue
+        if not isinstance(year, int) or bot_year <= year <= top_year:
+            return True
+
+    return False
+
+
+def store(key, filter_, result, started_generation, expires):
+    size = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+
+    with lock:
+        if started_generation != generation or size > max_bytes:
+            return
+
+        if key in entries:
+            stats['bytes'] -= entries.pop(key)[2]
+
+        entries[key] = (result, filter_, size, expires)
+        stats['bytes'] += size
+
+        while stats['bytes'] > max_bytes:
+            _, (_, _, evicted_size, _) = entries.popitem(last=False)
+            stats['bytes'] -= evicted_size
+            stats['evictions'] += 1
+
+
+def cached(fn):
+    """
+    Caches the results of a query function, results are shared between callers and must not be modified
+
+    On a miss, concurrent callers with the same key (and cache generation) wait for a single call of the function
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(state, 'bypass', False) or capturing():
+            return fn(*args, **kwargs)
+
+        key, filter_ = cache_key(fn, signature, args, kwargs)
+
+        with lock:
+            now = time.time()
+            if key in entries and entries[key][3] < now:
+                stats['bytes'] -= entries.pop(key)[2]
+                stats['expirations'] += 1
+            if key in entries:
+                entries.move_to_end(key)
+                stats['hits'] += 1
+                return entries[key][0]
+            stats['misses'] += 1
+            started_generation = generation
+            from_primary = secondary_reads and now - invalidated_at < primary_seconds
+
+        def compute():
+            if from_primary:
+                with primary_reads():
+                    result = fn(*args, **kwargs)
+            else:
+                result = fn(*args, **kwargs)
+            expires = now + secondary_ttl if secondary_reads and not from_primary else float('inf')
+            store(key, filter_, result, started_generation, expires)
+            return result
+
+        return singleflight.do(key + (started_generation,), compute)
+
+    return wrapper
+
+
+def invalidate(documents):
+    """
+    Bumps the generation and drops the cached results whose filter contains any of the inserted documents,
+    the results computed in the next primary_seconds are read from the primary
+    """
+    global generation, invalidated_at
+
+    inserted = inserted_keys(documents)
+
+    with lock:
+        generation += 1
+        invalidated_at = time.time()
+
+        for key, (_, filter_, size, _) in list(entries.items()):
+            if overlaps(filter_, inserted):
+                del entries[key]
+                stats['bytes'] -= size
+                stats['invalidations'] += 1
+
+
+def clear():
+    global generation
+
+    with lock:
+        generation += 1
+        entries.clear()
+        stats['bytes'] = 0
+
+
+@contextmanager
+def bypass():
+    """
+    Runs the queries of this thread inside the block against the database, without reading or filling the cache
+    """
+    previous = getattr(state, 'bypass', False)
+    state.bypass = True
+    try:
+        yield
+    finally:
+        state.bypass = previous
+
+
+def cache_stats():
+    with lock:
+        lookups = stats['hits'] + stats['misses']
+        return {**stats, 'entries': len(entries), 'generation': generation,
+                'hit_ratio': stats['hits'] / lookups if lookups else 0.0,
+                'coalesced': singleflight.singleflight_stats()['coalesced']}
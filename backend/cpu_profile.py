@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import pstats
+import cProfile
+from threading import Lock
+
+########################################################################################################################
+# On demand cProfile captures of the next call of a Dash callback (by output ids) or of an exN query,
+# saved as pstats and as collapsed stacks (flamegraph.pl, speedscope) in profile_dir
+# One capture at a time and at most one every min_interval seconds, only the profiled thread pays for it
+profile_dir = os.environ.get('CPU_PROFILE_DIR', '.profiles')
+min_interval = float(os.environ.get('CPU_PROFILE_INTERVAL', 60))
+arm_timeout = float(os.environ.get('CPU_PROFILE_ARM_TIMEOUT', 600))
+keep = int(os.environ.get('CPU_PROFILE_KEEP', 20))
+top_functions = 15
+max_depth = 64
+valid_id = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+lock = Lock()
+armed = {'target': None, 'until': 0.0}
+active = {'capture': None, 'last': 0.0}
+
+
+def wait_seconds(now):
+    return max(0.0, active['last'] + min_interval - now)
+
+
+def arm(target):
+    """
+    Profiles the next call of target, raises ValueError when a capture is armed, running or too recent
+    """
+    with lock:
+        now = time.time()
+        if armed['target'] is not None and now < armed['until']:
+            raise ValueError(f"{armed['target']} is already armed")
+        if active['capture'] is not None:
+            raise ValueError(f"{active['capture']['target']} is being profiled")
+        if wait_seconds(now):
+            raise ValueError(f"The next capture is allowed in {wait_seconds(now):.0f} s")
+        armed.update(target=target, until=now + arm_timeout)
+
+
+def disarm():
+    with lock:
+        armed.update(target=None, until=0.0)
+
+
+def capture_status():
+    """
+    Expected Output (dict):
+    {armed: target or None, running: target or None, next_capture_seconds: float}
+    """
+    with lock:
+        now = time.time()
+        return {'armed': armed['target'] if now < armed['until'] else None,
+                'running': active['capture']['target'] if active['capture'] else None,
+                'next_capture_seconds': wait_seconds(now)}
+
+
+def start_capture(name, requested=False):
+    """
+    Starts profiling this thread when name is armed (or the request asked for it) and returns the capture,
+    otherwise returns None at the cost of a dictionary lookup
+    """
+    if not requested and armed['target'] != name:
+        return None
+
+    with lock:
+        now = time.time()
+        if active['capture'] is not None:
+            return None
+        if armed['target'] == name and now < armed['until']:
+            armed.update(target=None, until=0.0)
+        elif not requested or wait_seconds(now):
+            return None
+
+        capture = {'target': name, 'started': now, 'start': time.perf_counter(), 'profile': cProfile.Profile()}
+        active.update(capture=capture, last=now)
+
+    capture['profile'].enable()
+    return capture
+
+
+def finish_capture(capture):
+    if capture is None:
+        return
+
+    capture['profile'].disable()
+    seconds = time.perf_counter() - capture['start']
+    try:
+        save_capture(capture, seconds)
+    except Exception as e:
+        print(f"Could not save the profile of {capture['target']}: {e}", flush=True)
+    finally:
+        with lock:
+            active['capture'] = None
+
+
+def frame_label(function):
+    filename, line, name = function
+    if filename == '~':
+        return name.replace(';', ',')
+    return f"{os.path.basename(filename)}:{name}:{line}".replace(';', ',')
+
+
+def collapsed_stacks(stats):
+    """
+    Rebuilds collapsed stacks ('a;b;c microseconds' lines) from the caller/callee edges of pstats, the time of
+    a function shared by several callers is split in proportion to the time of each call edge
+    """
+    callees = {}
+    for function, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+
+    lines = {}
+
+    def walk(function, stack, ratio):
+        tt, ct = stats[function][2:4]
+        stack = stack + [function]
+        path = ';'.join(frame_label(frame) for frame in stack)
+        micros = tt * ratio * 1e6
+        if micros >= 1:
+            lines[path] = lines.get(path, 0) + micros
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_time in callees.get(function, []):
+            callee_time = stats[callee][3]
+            # Recursive calls are folded into the first frame of the function
+            if callee in stack or not callee_time or edge_time * ratio * 1e6 < 1:
+                continue
+            walk(callee, stack, ratio * min(1.0, edge_time / callee_time))
+
+    for function, value in stats.items():
+        if not value[4]:
+            walk(function, [], 1.0)
+
+    return [f"{path} {round(micros)}" for path, micros in sorted(lines.items())]
+
+
+def save_capture(capture, seconds):
+    os.makedirs(profile_dir, exist_ok=True)
+    capture_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(capture['started']))}-" \
+                 f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', capture['target'])[:80]}"
+    path = os.path.join(profile_dir, capture_id)
+
+    capture['profile'].dump_stats(path + '.pstats')
+    stats = pstats.Stats(capture['profile']).stats
+
+    with open(path + '.collapsed', 'w') as file:
+        file.write('\n'.join(collapsed_stacks(stats)) + '\n')
+
+    top = sorted(stats.items(), key=lambda item: -item[1][3])[:top_functions]
+    summary = {'id': capture_id, 'target': capture['target'], 'started': capture['started'], 'seconds': seconds,
+               'calls': sum(value[1] for value in stats.values()),
+               'top': [{'function': frame_label(function), 'calls': nc, 'tottime': tt, 'cumtime': ct}
+                       for function, (cc, nc, tt, ct, callers) in top]}
+    with open(path + '.json', 'w') as file:
+        json.dump(summary, file)
+
+    print(f"Profiled {capture['target']} in {seconds:.3f} s, saved {path}.pstats", flush=True)
+
+    for old in all_captures()[keep:]:
+        for extension in ('.pstats', '.collapsed', '.json'):
+            try:
+                os.remove(os.path.join(profile_dir, old['id'] + extension))
+            except FileNotFoundError:
+                pass
+
+
+def all_captures():
+    """
+    Output (list of documents, newest first):
+    [{id, target, started, seconds, calls, top: [{function, calls, tottime, cumtime}, ....]}, ....]
+    """
+    if not os.path.isdir(profile_dir):
+        return []
+
+    captures = []
+    for filename in os.listdir(profile_dir):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(profile_dir, filename)) as file:
+                    captures.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+
+    return sorted(captures, key=lambda capture: -capture['started'])
+
+
+def capture_file(capture_id, extension):
+    """
+    Returns the path of the .pstats or .collapsed file of a capture, None for unknown captures
+    """
+    if extension not in ('pstats', 'collapsed') or not valid_id.match(capture_id or ''):
+        return None
+    path = os.path.join(profile_dir, f'{capture_id}.{extension}')
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import pandas as pd
+from backend.queries import insert_operation
+from backend.ingest import date_fields
+
+########################################################################################################################
+# TED contract award notices CSV export, read and coerced chunk by chunk (whole columns at a time, not per row)
+chunk_size = int(os.environ.get('CSV_CHUNK_SIZE', 10000))
+
+int_fields = ['YEAR', 'CPV', 'NUMBER_OFFERS']
+float_fields = ['VALUE_EURO', 'AWARD_VALUE_EURO']
+
+# 'B_' columns are 'Y' / 'N' flags, stored as 'Y' / 'N' like the JSON uploads and the baseline data
+flag_values = {'Y': 'Y', 'N': 'N', 'TRUE': 'Y', 'FALSE': 'N'}
+
+# Date formats of the TED exports, tried in order on the values the previous ones could not parse
+date_formats = ['%d-%b-%y', '%Y-%m-%d', '%d/%m/%y', '%d/%m/%Y']
+
+
+def parse_dates(column):
+    """
+    Parses a date column ('22-DEC-17', '2017-12-22', '22/12/17' or '22/12/2017'), NaT when not parsable
+    """
+    text = column.astype('string').str.strip()
+    dates = pd.Series(pd.NaT, index=column.index, dtype='datetime64[ns]')
+    for date_format in date_formats:
+        missing = dates.isna() & text.notna()
+        if not missing.any():
+            break
+        dates[missing] = pd.to_datetime(text[missing], format=date_format, errors='coerce')
+    return dates
+
+
+def coerce(chunk):
+    """
+    Coerces the types of a chunk of the CSV, columns missing from the file are skipped
+    """
+    for field in int_fields:
+        if field in chunk:
+            chunk[field] = pd.to_numeric(chunk[field], errors='coerce').round().astype('Int64')
+
+    for field in float_fields:
+        if field in chunk:
+            chunk[field] = pd.to_numeric(chunk[field], errors='coerce').astype('float64')
+
+    for field in date_fields:
+        if field in chunk:
+            chunk[field] = parse_dates(chunk[field])
+
+    for field in chunk.columns:
+        if field.startswith('B_'):
+            chunk[field] = chunk[field].astype('string').str.strip().str.upper().map(flag_values)
+
+    return chunk
+
+
+def records(chunk):
+    """
+    Returns the rows of a coerced chunk as documents with Python values, missing values are left out
+    """
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return [{field: value for field, value in row.items() if value is not None} for row in chunk.to_dict('records')]
+
+
+def load_csv(path, size=None, insert=insert_operation):
+    """
+    Inserts the contracts of a TED CSV export through insert (insert_operation by default) one chunk at a time
+
+    Output (dict):
+    {documents: int, chunks: int, seconds: float, docs_per_sec: float}
+    """
+    report = {'documents': 0, 'chunks': 0, 'seconds': 0.0, 'docs_per_sec': 0.0}
+    start = time.time()
+
+    for chunk in pd.read_csv(path, chunksize=size or chunk_size, dtype={field: str for field in date_fields}):
+        chunk_start = time.time()
+        documents = records(coerce(chunk))
+        insert(documents)
+
+        report['chunks'] += 1
+        report['documents'] += len(documents)
+        report['seconds'] = time.time() - start
+        report['docs_per_sec'] = report['documents'] / report['seconds'] if report['seconds'] else 0.0
+        print(f"Inserted chunk {report['chunks']} ({len(documents)} documents in {time.time() - chunk_start:.3f}s), "
+              f"{report['documents']} documents at {report['docs_per_sec']:.0f} docs/sec", flush=True)
+
+    return report
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(f"{path}: {load_csv(path)}", flush=True)
@@ -0,0 +1,166 @@
+import os
+import time
+from types import MappingProxyType
+from threading import Lock
+from backend.DB import db
+
+########################################################################################################################
+# The cpv and iso_codes reference collections are tiny and static, they are kept in memory as immutable dicts
+# and joined to the query results in Python. The seeds are used until (and if) the collections can be read.
+ttl = float(os.environ.get('DIMENSIONS_TTL', 24 * 60 * 60))
+
+seed_cpv = {
+    '18': 'Clothing, footwear, luggage articles and accessories',
+    '19': 'Leather and textile fabrics, plastic and rubber materials',
+    '51': 'Installation services (except software)',
+    '44': 'Construction structures and materials; auxiliary products to construction (except electric apparatus)',
+    '30': 'Office and computing machinery, equipment and supplies except furniture and software packages',
+    '73': 'Research and development services and related consultancy services',
+    '50': 'Repair and maintenance services',
+    '33': 'Medical equipments, pharmaceuticals and personal care products',
+    '34': 'Transport equipment and auxiliary products to transportation',
+    '85': 'Health and social work services',
+    '66': 'Financial and insurance services',
+    '31': 'Electrical machinery, apparatus, equipment and consumables; lighting',
+    '80': 'Education and training services',
+    '70': 'Real estate services',
+    '65': 'Public utilities',
+    '72': 'IT services: consulting, software development, Internet and support',
+    '90': 'Sewage, refuse, cleaning and environmental services',
+    '15': 'Food, beverages, tobacco and related products',
+    '79': 'Business services: law, marketing, consulting, recruitment, printing and security',
+    '35': 'Security, fire-fighting, police and defence equipment',
+    '76': 'Services related to the oil and gas industry',
+    '09': 'Petroleum products, fuel, electricity and other sources of energy',
+    '75': 'Administration, defence and social security services',
+    '32': 'Radio, television, communication, telecommunication and related equipment',
+    '03': 'Agricultural, farming, fishing, forestry and related products',
+    '92': 'Recreational, cultural and sporting services',
+    '98': 'Other community, social and personal services',
+    '45': 'Construction work',
+    '63': 'Supporting and auxiliary transport services; travel agencies services',
+    '38': 'Laboratory, optical and precision equipments (excl. glasses)',
+    '77': 'Agricultural, forestry, horticultural, aquacultural and apicultural services',
+    '39': 'Furniture (incl. office furniture), furnishings, domestic appliances (excl. lighting) and cleaning products',
+    '48': 'Software package and information systems',
+    '60': 'Transport services (excl. Waste transport)',
+    '16': 'Agricultural machinery',
+    '71': 'Architectural, construction, engineering and inspection services',
+    '55': 'Hotel, restaurant and retail trade services',
+    '37': 'Musical instruments, sport goods, games, toys, handicraft, art materials and accessories',
+    '64': 'Postal and telecommunications services',
+    '41': 'Collected and purified water',
+    '43': 'Machinery for mining, quarrying, construction equipment',
+    '42': 'Industrial machinery',
+    '14': 'Mining, basic metals and related products',
+    '22': 'Printed matter and related products',
+    '24': 'Chemical products',
+}
+
+seed_countries = {
+    'MK': 'North Macedonia',
+    'LT': 'Lithuania',
+    'SI': 'Slovenia',
+    'CY': 'Cyprus',
+    'NL': 'Netherlands',
+    'LI': 'Liechtenstein',
+    'HR': 'Croatia',
+    'AT': 'Austria',
+    'RO': 'Romania',
+    'ES': 'Spain',
+    'SE': 'Sweden',
+    'DK': 'Denmark',
+    'FI': 'Finland',
+    'PL': 'Poland',
+    'DE': 'Germany',
+    'GR': 'Greece',
+    'FR': 'France',
+    'CH': 'Switzerland',
+    'BG': 'Bulgaria',
+    'HU': 'Hungary',
+    'BE': 'Belgium',
+    'SK': 'Slovakia',
+    'NO': 'Norway',
+    'IT': 'Italy',
+    'IS': 'Iceland',
+    'EE': 'Estonia',
+    'LV': 'Latvia',
+    'CZ': 'Czechia',
+    'MT': 'Malta',
+    'LU': 'Luxembourg',
+    'UK': 'United Kingdom',
+    'IE': 'Ireland',
+    'PT': 'Portugal',
+}
+
+dimensions = {
+    'cpv': MappingProxyType(dict(seed_cpv)),
+    'countries': MappingProxyType(dict(seed_countries)),
+}
+loaded_at = None
+lock = Lock()
+
+
+def load_cpv():
+    """
+    Returns {CPV Division code: 'cpv_division_description'} read from the cpv collection
+    """
+    documents = db.cpv.find({}, {'_id': 0, 'cpv_division': 1, 'cpv_division_description': 1})
+    return {str(document['cpv_division']).zfill(2): document['cpv_division_description']
+            for document in documents if 'cpv_division' in document and 'cpv_division_description' in document}
+
+
+def load_countries():
+    """
+    Returns {'ISO_COUNTRY_CODE': country name} read from the iso_codes collection
+    """
+    documents = db.iso_codes.find({}, {'_id': 0, 'alpha-2': 1, 'name': 1})
+    return {document['alpha-2']: document['name']
+            for document in documents if 'alpha-2' in document and 'name' in document}
+
+
+def refresh():
+    """
+    Reloads both dimensions, on failure the previous values are kept
+    """
+    global dimensions, loaded_at
+
+    try:
+        cpv = {**seed_cpv, **load_cpv()}
+        countries = {**seed_countries, **load_countries()}
+    except Exception as e:
+        print(f'Could not load the cpv and iso_codes collections: {e}', flush=True)
+        cpv, countries = dimensions['cpv'], dimensions['countries']
+
+    dimensions = {'cpv': MappingProxyType(cpv), 'countries': MappingProxyType(countries)}
+    loaded_at = time.time()
+
+
+def get(name):
+    """
+    Returns the dimension name ('cpv' or 'countries'), loading it on first use and once it is older than ttl
+    """
+    if loaded_at is None or time.time() - loaded_at > ttl:
+        # Only one thread reloads, the others keep answering with the current values
+        if lock.acquire(blocking=loaded_at is None):
+            try:
+                if loaded_at is None or time.time() - loaded_at > ttl:
+                    refresh()
+            finally:
+                lock.release()
+
+    return dimensions[name]
+
+
+def cpv_names():
+    """
+    CPV Division descriptions (located in cpv collection as 'cpv_division_description')
+    """
+    return get('cpv')
+
+
+def country_names():
+    """
+    Country names of 'ISO_COUNTRY_CODE' codes (located in iso_codes collection)
+    """
+    return get('countries')
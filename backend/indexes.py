@@ -0,0 +1,291 @@
+from pymongo import ASCENDING
+from backend.pipelines import capture
+from backend.queries import query_list
+from backend.rollups import rollups, ensure_rollup_index
+
+########################################################################################################################
+range_operators = ('$gt', '$gte', '$lt', '$lte')
+
+
+def captured_pipelines():
+    """
+    Runs every function of query_list in capture mode
+
+    Expected Output (list of tuples):
+    [(query name, collection, pipeline), ....]
+    """
+    captured = []
+
+    for fn in query_list:
+        with capture() as calls:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Could not capture {fn.__name__}: {e}", flush=True)
+        captured += [(fn.__name__, collection, pipeline) for collection, pipeline in calls]
+
+    return captured
+
+
+def match_conditions(match):
+    """
+    Flattens a '$match' document (including '$and' lists) into a list of (field, condition)
+    """
+    conditions = []
+
+    for field, condition in match.items():
+        if field == '$and':
+            for sub_match in condition:
+                conditions += match_conditions(sub_match)
+        elif not field.startswith('$'):
+            conditions.append((field, condition))
+
+    return conditions
+
+
+def index_keys(pipeline):
+    """
+    Proposes the compound index of a pipeline from its leading '$match' and the '$sort' right after it
+
+    Fields follow the equality, sort, range rule. '$in' is an equality unless there is a sort to serve,
+    in which case it is placed with the ranges so the index still returns the documents in sort order.
+    """
+    if not pipeline or '$match' not in pipeline[0]:
+        return None
+
+    equality, membership, ranges = [], [], []
+
+    for field, condition in match_conditions(pipeline[0]['$match']):
+        if field in equality + membership + ranges:
+            continue
+        if isinstance(condition, dict) and any(operator in condition for operator in range_operators):
+            ranges.append(field)
+        elif isinstance(condition, dict) and '$in' in condition:
+            membership.append(field)
+        elif not isinstance(condition, dict):
+            equality.append(field)
+
+    sort = []
+    if len(pipeline) > 1 and '$sort' in pipeline[1]:
+        sort = [(field, direction) for field, direction in pipeline[1]['$sort'].items()
+                if field not in equality]
+
+    keys = [(field, ASCENDING) for field in equality]
+    if sort:
+        keys += sort + [(field, ASCENDING) for field in membership + ranges]
+    else:
+        keys += [(field, ASCENDING) for field in membership + ranges]
+
+    return keys or None
+
+
+def propose_indexes(captured):
+    """
+    Returns the indexes proposed for the captured pipelines, an index that is a prefix of another is dropped
+
+    Expected Output (list of documents):
+    [{collection: collection, keys: [(field, direction), ....], queries: [query name, ....]}, ....]
+    """
+    proposals = {}
+
+    for name, collection, pipeline in captured:
+        keys = index_keys(pipeline)
+        if keys is None:
+            continue
+        proposal = proposals.setdefault((collection.name, tuple(keys)),
+                                        {'collection': collection, 'keys': keys, 'queries': []})
+        proposal['queries'].append(name)
+
+    kept = []
+    for proposal in sorted(proposals.values(), key=lambda proposal: -len(proposal['keys'])):
+        longer = next((other for other in kept if other['collection'].name == proposal['collection'].name
+                       and other['keys'][:len(proposal['keys'])] == proposal['keys']), None)
+        if longer is None:
+            kept.append(proposal)
+        else:
+            longer['queries'] += proposal['queries']
+
+    return kept
+
+
+def existing_index(collection, keys):
+    """
+    Returns the name of an index of collection whose keys start with keys, None if there is none
+    """
+    for name, info in collection.index_information().items():
+        if [(field, direction) for field, direction in info['key']][:len(keys)] == list(keys):
+            return name
+    return None
+
+
+def create_indexes(proposals):
+    """
+    Creates the proposed indexes that are not yet served by an existing index (safe to call repeatedly)
+    """
+    for proposal in proposals:
+        name = existing_index(proposal['collection'], proposal['keys'])
+        if name is None:
+            name = proposal['collection'].create_index(proposal['keys'])
+            proposal['created'] = True
+        else:
+            proposal['created'] = False
+        proposal['name'] = name
+
+    return proposals
+
+
+def explain(collection, pipeline, verbosity='executionStats'):
+    command = {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}}
+    return collection.database.command('explain', command, verbosity=verbosity)
+
+
+def winning_plan(explain_output):
+    """
+    Returns the stages of the first winning plan of an explain output, from the first to run ('IXSCAN > FETCH')
+    """
+    chain = []
+
+    def find(node):
+        if isinstance(node, dict):
+            if isinstance(node.get('winningPlan'), dict):
+                return node['winningPlan']
+            nodes = node.values()
+        elif isinstance(node, list):
+            nodes = node
+        else:
+            return None
+        return next((plan for plan in map(find, nodes) if plan is not None), None)
+
+    node = find(explain_output)
+    # Slot based engine plans (MongoDB 5.0+) keep the classic plan under 'queryPlan'
+    node = node.get('queryPlan', node) if node else None
+
+    while isinstance(node, dict) and 'stage' in node:
+        chain.append(node['stage'])
+        node = node.get('inputStage') or (node.get('inputStages') or [None])[0]
+
+    return ' > '.join(reversed(chain))
+
+
+def plan_summary(explain_output):
+    """
+    Walks an explain output (skipping the rejected plans and the explained command)
+
+    Expected Output (dict):
+    {stages: {stage, ....}, indexes: {index name, ....}, docsExamined: int, keysExamined: int, nReturned: int,
+     winningPlan: 'IXSCAN > FETCH', collscan: bool, inMemorySort: bool, spilled: bool}
+
+    inMemorySort is a blocking 'SORT' of the query plan or a '$sort' stage the pipeline could not push to an index,
+    spilled is any stage that wrote to disk ('usedDisk' or 'spills')
+    """
+    summary = {'stages': set(), 'indexes': set(), 'docsExamined': 0, 'keysExamined': 0, 'nReturned': 0,
+               'inMemorySort': False, 'spilled': False}
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+        elif isinstance(node, dict):
+            if isinstance(node.get('stage'), str):
+                summary['stages'].add(node['stage'])
+            if isinstance(node.get('indexName'), str):
+                summary['indexes'].add(node['indexName'])
+            stats = node.get('executionStats')
+            if isinstance(stats, dict):
+                summary['docsExamined'] += stats.get('totalDocsExamined', 0)
+                summary['keysExamined'] += stats.get('totalKeysExamined', 0)
+                summary['nReturned'] += stats.get('nReturned', 0)
+            if '$sort' in node or node.get('stage') == 'SORT':
+                summary['inMemorySort'] = True
+            if node.get('usedDisk') is True or (node.get('spills') or 0) > 0:
+                summary['spilled'] = True
+            for key, value in node.items():
+                if key not in ('rejectedPlans', 'allPlansExecution', 'command'):
+                    walk(value)
+
+    walk(explain_output)
+    summary['collscan'] = 'COLLSCAN' in summary['stages']
+    summary['winningPlan'] = winning_plan(explain_output)
+
+    return summary
+
+
+def explain_query(fn):
+    """
+    Explains (executionStats) every pipeline a query function runs, the pipelines are captured, not executed
+
+    Expected Output (list of documents):
+    [{collection: collection name, pipeline: pipeline, stages: [stage, ....], indexes: [index name, ....],
+      docsExamined, keysExamined, nReturned, winningPlan, collscan, inMemorySort, spilled}, ....]
+    """
+    with capture() as calls:
+        fn()
+
+    plans = []
+    for collection, pipeline in calls:
+        summary = plan_summary(explain(collection, pipeline))
+        summary.update({'collection': collection.name, 'pipeline': pipeline,
+                        'stages': sorted(summary['stages']), 'indexes': sorted(summary['indexes'])})
+        plans.append(summary)
+
+    return plans
+
+
+def verify_indexes(captured):
+    """
+    Explains every captured pipeline and checks it is answered by an index instead of a COLLSCAN
+
+    The expected speedup is the number of documents a COLLSCAN reads divided by the documents the plan examined
+    """
+    results = []
+
+    for name, collection, pipeline in captured:
+        summary = plan_summary(explain(collection, pipeline))
+        documents = collection.estimated_document_count()
+        summary.update({
+            'query': name,
+            'collection': collection.name,
+            'speedup': documents / max(summary['docsExamined'], 1) if not summary['collscan'] else 1.0
+        })
+        results.append(summary)
+
+    return results
+
+
+def index_sizes(collection):
+    return collection.database.command('collStats', collection.name).get('indexSizes', {})
+
+
+def ensure_indexes():
+    """
+    Creates the rollup key indexes and the indexes proposed for query_list, used at startup
+    """
+    for collection, key_fields, _, _ in rollups:
+        ensure_rollup_index(collection, key_fields)
+
+    return create_indexes(propose_indexes(captured_pipelines()))
+
+
+def index_report():
+    captured = captured_pipelines()
+    proposals = ensure_indexes()
+
+    print("Indexes:", flush=True)
+    for proposal in proposals:
+        collection = proposal['collection']
+        size = index_sizes(collection).get(proposal['name'], 0)
+        status = 'created' if proposal['created'] else 'exists'
+        print(f"  {collection.name}.{proposal['name']} ({status}, {size / 1024:.1f} KB) "
+              f"for {', '.join(sorted(set(proposal['queries'])))}", flush=True)
+
+    print("Query plans:", flush=True)
+    for result in verify_indexes(captured):
+        used = ', '.join(sorted(result['indexes'])) or '-'
+        flag = 'COLLSCAN' if result['collscan'] else 'index'
+        print(f"  {result['query']} on {result['collection']}: {flag} (indexes {used}), "
+              f"{result['docsExamined']} docs / {result['keysExamined']} keys examined, "
+              f"expected speedup x{result['speedup']:.1f}", flush=True)
+
+
+if __name__ == '__main__':
+    index_report()
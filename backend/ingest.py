@@ -0,0 +1,156 @@
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+from backend.DB import eu
+from backend.DB import migrations
+
+########################################################################################################################
+# Fields precomputed at ingest time (and backfilled on the documents inserted before), queries read them as scalars
+
+
+def cpv_division(cpv):
+    """
+    Returns the CPV Division (first two digits of the 8 digit 'CPV' code) as a two digit string
+    """
+    if cpv is None:
+        return None
+    return str(cpv).strip().zfill(8)[:2]
+
+
+def number(value):
+    """
+    Returns value as a float or None when it is missing or not numeric
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(value):
+    """
+    Returns a datetime for the TED date fields ('22-DEC-17' like strings) or None when not parsable
+    """
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip().title(), '%d-%b-%y')
+    except ValueError:
+        return None
+
+
+def derived_fields(document):
+    """
+    Returns the fields precomputed at ingest time
+
+    CPV_DIVISION = first two digits of 'CPV', (string)
+    EU_FUNDS = contract received european funds ('B_EU_FUNDS'), (bool)
+    """
+    return {
+        'CPV_DIVISION': cpv_division(document.get('CPV')),
+        'EU_FUNDS': document.get('B_EU_FUNDS') in ('Y', True),
+    }
+
+
+derived_sources = ['CPV', 'B_EU_FUNDS']
+
+date_fields = ['DT_DISPATCH', 'DT_AWARD']
+
+
+def days_award_to_dispatch(document):
+    """
+    Returns 'DT-DISPATCH' - 'DT-AWARD' in days, None when any of the dates is missing
+    """
+    dispatch = parse_date(document.get('DT_DISPATCH'))
+    award = parse_date(document.get('DT_AWARD'))
+    if dispatch is None or award is None:
+        return None
+    return (dispatch - award).days
+
+
+def award_minus_value_euro(document):
+    """
+    Returns 'AWARD_VALUE_EURO' - 'VALUE_EURO', None when any of the values is missing
+    """
+    award_value = number(document.get('AWARD_VALUE_EURO'))
+    value = number(document.get('VALUE_EURO'))
+    if award_value is None or value is None:
+        return None
+    return award_value - value
+
+
+def date_fields_normalised(document):
+    """
+    Returns the date fields converted to datetimes (stored as BSON dates) and the differences used by ex9_cpv_bar_diff
+
+    DAYS_AWARD_TO_DISPATCH = 'DT-DISPATCH' - 'DT-AWARD' in days, (int)
+    AWARD_MINUS_VALUE_EURO = 'AWARD_VALUE_EURO' - 'VALUE_EURO', (float)
+
+    Dates that can not be parsed are left as they are
+    """
+    fields = {field: parse_date(document[field]) for field in date_fields if parse_date(document.get(field))}
+    fields['DAYS_AWARD_TO_DISPATCH'] = days_award_to_dispatch(document)
+    fields['AWARD_MINUS_VALUE_EURO'] = award_minus_value_euro(document)
+    return fields
+
+
+date_sources = date_fields + ['AWARD_VALUE_EURO', 'VALUE_EURO']
+
+
+def derive(document):
+    """
+    Adds the derived fields and normalised dates to a document about to be inserted (in place) and returns it
+    """
+    document.update(derived_fields(document))
+    document.update(date_fields_normalised(document))
+    return document
+
+
+def backfill(job, sources, fields_fn, batch_size=1000):
+    """
+    Sets fields_fn(document) on every document of the eu collection, in batches of batch_size in '_id' order
+
+    The last '_id' of each finished batch is saved in the migrations collection, so an interrupted job resumes
+    where it stopped. Documents inserted while it runs already have the fields from insert_operation.
+    """
+    checkpoint = migrations.find_one({'_id': job}) or {'_id': job, 'last_id': None, 'updated': 0, 'done': False}
+
+    if checkpoint['done']:
+        print(f"Backfill {job} already done ({checkpoint['updated']} documents)", flush=True)
+        return checkpoint
+
+    while True:
+        filter_ = {} if checkpoint['last_id'] is None else {'_id': {'$gt': checkpoint['last_id']}}
+        batch = list(eu.find(filter_, {field: 1 for field in sources}).sort('_id', ASCENDING).limit(batch_size))
+
+        if not batch:
+            break
+
+        eu.bulk_write([UpdateOne({'_id': document['_id']}, {'$set': fields_fn(document)}) for document in batch],
+                      ordered=False)
+
+        checkpoint['last_id'] = batch[-1]['_id']
+        checkpoint['updated'] += len(batch)
+        migrations.replace_one({'_id': job}, checkpoint, upsert=True)
+        print(f"Backfill {job}: {checkpoint['updated']} documents", flush=True)
+
+    checkpoint['done'] = True
+    migrations.replace_one({'_id': job}, checkpoint, upsert=True)
+
+    return checkpoint
+
+
+def backfill_derived_fields(batch_size=1000):
+    return backfill('derived_fields', derived_sources, derived_fields, batch_size)
+
+
+def backfill_dates(batch_size=1000):
+    return backfill('dates', date_sources, date_fields_normalised, batch_size)
+
+
+if __name__ == '__main__':
+    backfill_derived_fields()
+    backfill_dates()
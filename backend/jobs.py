@@ -0,0 +1,139 @@
+import os
+import time
+import uuid
+import queue
+from collections import OrderedDict
+from threading import Lock, Thread
+from backend.queries import insert_operation
+from backend.streaming import stream_insert
+
+########################################################################################################################
+# Background ingestion, jobs wait in a bounded queue for a pool of worker threads (they share the MongoClient pool)
+workers = int(os.environ.get('JOB_WORKERS', 2))
+max_queued = int(os.environ.get('JOB_QUEUE_SIZE', 16))
+
+# Finished jobs kept for the status page
+max_history = 100
+
+pending = queue.Queue(maxsize=max_queued)
+jobs = OrderedDict()
+lock = Lock()
+threads = []
+
+
+def job_status(job):
+    """
+    Output (dict):
+    {id, name, state, documents, error, submitted, seconds, docs_per_sec, result}
+
+    state is one of 'queued', 'running', 'done' or 'failed', seconds is the running time (queue wait excluded)
+    """
+    seconds = ((job['finished'] or time.time()) - job['started']) if job['started'] else 0.0
+    return {**{key: job[key] for key in ('id', 'name', 'state', 'documents', 'error', 'submitted', 'result')},
+            'seconds': seconds,
+            'docs_per_sec': job['documents'] / seconds if seconds else 0.0}
+
+
+def get_job(job_id):
+    with lock:
+        job = jobs.get(job_id)
+        return job_status(job) if job else None
+
+
+def all_jobs():
+    with lock:
+        return [job_status(job) for job in jobs.values()]
+
+
+def progress(job, documents):
+    with lock:
+        job['documents'] += documents
+
+
+def run(job, fn, args):
+    with lock:
+        job['state'], job['started'] = 'running', time.time()
+
+    try:
+        result, state, error = fn(job, *args), 'done', None
+    except Exception as e:
+        result, state, error = None, 'failed', str(e)
+        print(f"Job {job['id']} ({job['name']}) failed: {e}", flush=True)
+
+    with lock:
+        job.update({'state': state, 'error': error, 'result': result, 'finished': time.time()})
+
+        finished = [job_id for job_id, other in jobs.items() if other['state'] in ('done', 'failed')]
+        for job_id in finished[:max(len(finished) - max_history, 0)]:
+            del jobs[job_id]
+
+
+def worker():
+    while True:
+        job, fn, args = pending.get()
+        try:
+            run(job, fn, args)
+        finally:
+            pending.task_done()
+
+
+def start_workers():
+    with lock:
+        while len(threads) < workers:
+            thread = Thread(target=worker, name=f'ingest-{len(threads)}', daemon=True)
+            thread.start()
+            threads.append(thread)
+
+
+def new_job(name):
+    job = {'id': uuid.uuid4().hex[:12], 'name': name, 'state': 'queued', 'documents': 0, 'error': None,
+           'result': None, 'submitted': time.time(), 'started': None, 'finished': None}
+
+    with lock:
+        jobs[job['id']] = job
+
+    return job
+
+
+def submit(name, fn, *args):
+    """
+    Queues fn(job, *args) and returns the job id, fn reports the documents it processed with progress(job, n)
+
+    Raises queue.Full when max_queued jobs are already waiting, the caller should ask to retry later
+    """
+    start_workers()
+    job = new_job(name)
+
+    try:
+        pending.put_nowait((job, fn, args))
+    except queue.Full:
+        with lock:
+            del jobs[job['id']]
+        raise
+
+    return job['id']
+
+
+def start(name, fn, *args):
+    """
+    Runs fn(job, *args) in a thread of its own and returns the job id, for a job that mostly waits for its input
+    (an upload ingested while it is received) and would otherwise hold one of the workers
+    """
+    job = new_job(name)
+    Thread(target=run, args=(job, fn, args), name=f"job-{job['id']}", daemon=True).start()
+    return job['id']
+
+
+def ingest(job, chunks):
+    def insert(batch):
+        insert_operation(batch)
+        progress(job, len(batch))
+
+    return stream_insert(chunks, insert=insert)
+
+
+def submit_ingest(name, chunks):
+    """
+    Queues the batched insert of the documents parsed from chunks (JSON array or NDJSON, see backend/streaming.py)
+    """
+    return submit(name, ingest, chunks)
@@ -0,0 +1,74 @@
+import os
+import gc
+import pickle
+import tracemalloc
+
+########################################################################################################################
+# Python memory of a call measured with tracemalloc (memory mode of backend/performance_evaluation.py)
+# Every thread of the process is traced while a call is measured, measure on a server without other traffic
+frames = int(os.environ.get('MEMORY_TRACE_FRAMES', 1))
+top_sites = int(os.environ.get('MEMORY_TOP_SITES', 10))
+
+ignored = [tracemalloc.Filter(False, filename) for filename in (__file__, tracemalloc.__file__, '<unknown>',
+                                                                '<frozen importlib._bootstrap>',
+                                                                '<frozen importlib._bootstrap_external>')]
+
+
+def result_size(result):
+    """
+    Returns the documents (items of a list or dict result) and the pickled bytes of a result
+    """
+    documents = len(result) if isinstance(result, (list, dict)) else None
+    try:
+        size = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        size = None
+    return documents, size
+
+
+def allocation_sites(snapshot, before):
+    sites = []
+    for stat in snapshot.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno'):
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        sites.append({'site': f'{frame.filename}:{frame.lineno}', 'bytes': stat.size_diff, 'count': stat.count_diff})
+        if len(sites) == top_sites:
+            break
+    return sites
+
+
+def measure_memory(fn, *args):
+    """
+    Calls fn(*args) with tracemalloc tracing, peak is the most memory the call held at once,
+    retained what it still holds once its result is dropped (module caches, connection buffers)
+    and sites the lines that allocated the memory held when it returned
+
+    Expected Output (dict):
+    {peak_bytes, retained_bytes, result_documents, result_bytes, sites: [{site, bytes, count}, ....]}
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+
+    try:
+        gc.collect()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        before = tracemalloc.take_snapshot()
+
+        result = fn(*args)
+
+        peak = tracemalloc.get_traced_memory()[1] - base
+        sites = allocation_sites(tracemalloc.take_snapshot(), before)
+        documents, size = result_size(result)
+
+        del result
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    return {'peak_bytes': peak, 'retained_bytes': max(0, retained), 'result_documents': documents,
+            'result_bytes': size, 'sites': sites}
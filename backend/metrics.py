@@ -0,0 +1,144 @@
+import time
+import functools
+from bisect import bisect_left
+from contextlib import nullcontext
+from threading import Lock, local
+from backend.tracing import open_span, close_span
+from backend.cpu_profile import start_capture, finish_capture
+from backend.cache import bypass
+from backend.pipelines import capturing
+
+########################################################################################################################
+# Metrics registry rendered in the Prometheus text format (see the /metrics route of apps/routes.py)
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+items_buckets = [0, 1, 5, 10, 25, 50, 100, 250, 500, 1000]
+bytes_buckets = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+# {metric name: {type, help, label, buckets, values: {label value: value or [bucket counts, sum, count]}}}
+families = {}
+lock = Lock()
+
+# Instrumented functions running in this thread, innermost last, used by record_error
+state = local()
+
+
+def register(name, type_, help_, label, buckets=None):
+    families[name] = {'type': type_, 'help': help_, 'label': label, 'buckets': buckets, 'values': {}}
+
+
+def inc(name, label_value, amount=1):
+    family = families[name]
+    with lock:
+        family['values'][label_value] = family['values'].get(label_value, 0) + amount
+
+
+def observe(name, label_value, value):
+    family = families[name]
+    with lock:
+        histogram = family['values'].get(label_value)
+        if histogram is None:
+            histogram = family['values'][label_value] = [[0] * (len(family['buckets']) + 1), 0.0, 0]
+        histogram[0][bisect_left(family['buckets'], value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+for kind, label, description in [('query', 'query', 'exN query functions of backend/queries.py'),
+                                  ('figure', 'builder', 'figure builders of apps/dcc_functions.py'),
+                                  ('callback', 'output', 'Dash callbacks, by output ids')]:
+    register(f'dashboard_{kind}_seconds', 'histogram', f'Latency of the {description}', label, latency_buckets)
+    register(f'dashboard_{kind}_errors_total', 'counter', f'Failures of the {description}', label)
+    register(f'dashboard_{kind}_in_flight', 'gauge', f'Running calls of the {description}', label)
+
+register('dashboard_query_result_items', 'histogram', 'Items (rows or keys) returned by the exN query functions',
+         'query', items_buckets)
+register('dashboard_callback_response_bytes', 'histogram', 'Size of the Dash callback responses', 'output',
+         bytes_buckets)
+
+
+def instrumented(kind):
+    """
+    Decorator recording the latency, errors and in-flight calls of a 'query' or 'figure' function,
+    and the number of items returned by queries (and their span when the request is traced, their profile when armed)
+    """
+    def decorator(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if capturing():
+                # Only collecting the pipelines (explain, index advisor), nothing runs that is worth recording
+                return fn(*args, **kwargs)
+
+            running = state.__dict__.setdefault('running', [])
+            running.append((kind, name))
+            inc(f'dashboard_{kind}_in_flight', name)
+            opened = open_span(kind, name)
+            capture = start_capture(name)
+            start = time.perf_counter()
+            error = None
+            try:
+                # An armed call runs the query itself, a cache hit would leave nothing to profile
+                with bypass() if capture is not None else nullcontext():
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+                inc(f'dashboard_{kind}_errors_total', name)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                finish_capture(capture)
+                observe(f'dashboard_{kind}_seconds', name, elapsed)
+                inc(f'dashboard_{kind}_in_flight', name, -1)
+                close_span(opened, error)
+                running.pop()
+
+            if kind == 'query' and hasattr(result, '__len__'):
+                observe('dashboard_query_result_items', name, len(result))
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_error(error, kind='figure'):
+    """
+    Counts an error a running instrumented function handled itself (the figure builders return gone_wrong())
+    """
+    name = next((name for running_kind, name in reversed(getattr(state, 'running', [])) if running_kind == kind),
+                'unknown')
+    inc(f'dashboard_{kind}_errors_total', name)
+    print(f'{name} failed: {error!r}', flush=True)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format (version 0.0.4)
+    """
+    lines = []
+
+    with lock:
+        for name, family in families.items():
+            lines += [f"# HELP {name} {family['help']}", f"# TYPE {name} {family['type']}"]
+
+            for label_value, value in sorted(family['values'].items()):
+                label = f'{family["label"]}="{escape(label_value)}"'
+
+                if family['type'] != 'histogram':
+                    lines.append(f'{name}{{{label}}} {value}')
+                    continue
+
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(family['buckets'] + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines += [f'{name}_sum{{{label}}} {total}', f'{name}_count{{{label}}} {count}']
+
+    return '\n'.join(lines) + '\n'
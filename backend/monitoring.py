@@ -0,0 +1,157 @@
+import os
+import time
+from collections import deque
+from collections.abc import Mapping
+from threading import Lock, local
+import bson
+from pymongo import monitoring
+
+########################################################################################################################
+# Driver events of the MongoClient of backend/DB.py, commands per (command, collection) and connection pool usage
+slow_ms = float(os.environ.get('MONGO_SLOW_MS', 100))
+history = int(os.environ.get('MONGO_COMMAND_HISTORY', 500))
+# Measuring the reply size encodes every reply a second time, off by default (the documents are always counted)
+reply_sizes = os.environ.get('MONGO_REPLY_SIZES', '0') == '1'
+
+lock = Lock()
+state = local()
+
+# Collection of the running commands by request id, known from the started event only
+running = {}
+
+commands = {}
+recent = deque(maxlen=history)
+pool = {'created': 0, 'closed': 0, 'checked_out': 0, 'checked_in': 0, 'checkout_failed': 0, 'cleared': 0,
+        'in_use': 0, 'max_in_use': 0, 'wait_count': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+
+def command_collection(event):
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else None
+
+
+def reply_documents(reply):
+    """
+    Number of documents of a find/aggregate/getMore reply (its cursor batch), 0 for the other commands
+    """
+    cursor = reply.get('cursor')
+    if not isinstance(cursor, Mapping):
+        return 0
+    return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+
+
+def record_command(event, failed):
+    with lock:
+        collection = running.pop((event.connection_id, event.request_id), None)
+    seconds = event.duration_micros / 1e6
+    documents = 0 if failed else reply_documents(event.reply)
+    reply_bytes = len(bson.encode(event.reply)) if reply_sizes and not failed else 0
+
+    with lock:
+        stats = commands.setdefault((event.command_name, collection),
+                                    {'count': 0, 'failures': 0, 'slow': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                     'reply_documents': 0, 'reply_bytes': 0})
+        stats['count'] += 1
+        stats['failures'] += failed
+        stats['slow'] += seconds * 1000 >= slow_ms
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['reply_documents'] += documents
+        stats['reply_bytes'] += reply_bytes
+
+        recent.append({'command': event.command_name, 'collection': collection, 'seconds': seconds,
+                       'reply_documents': documents, 'reply_bytes': reply_bytes, 'failed': bool(failed),
+                       'failure': str(event.failure) if failed else None,
+                       'connection_id': f'{event.connection_id[0]}:{event.connection_id[1]}',
+                       'server_connection_id': getattr(event, 'server_connection_id', None),
+                       'time': time.time()})
+
+
+class CommandListener(monitoring.CommandListener):
+
+    def started(self, event):
+        with lock:
+            running[(event.connection_id, event.request_id)] = command_collection(event)
+
+    def succeeded(self, event):
+        record_command(event, False)
+
+    def failed(self, event):
+        record_command(event, True)
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with lock:
+            pool['cleared'] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with lock:
+            pool['created'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with lock:
+            pool['closed'] += 1
+
+    def connection_check_out_started(self, event):
+        # The check out is finished (or failed) by the same thread
+        state.check_out_start = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with lock:
+            pool['checkout_failed'] += 1
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(state, 'check_out_start', time.perf_counter())
+        with lock:
+            pool['checked_out'] += 1
+            pool['in_use'] += 1
+            pool['max_in_use'] = max(pool['max_in_use'], pool['in_use'])
+            pool['wait_count'] += 1
+            pool['wait_seconds'] += wait
+            pool['max_wait_seconds'] = max(pool['max_wait_seconds'], wait)
+
+    def connection_checked_in(self, event):
+        with lock:
+            pool['checked_in'] += 1
+            pool['in_use'] -= 1
+
+
+listeners = [CommandListener(), PoolListener()]
+
+
+def monitoring_stats(recent_count=20):
+    """
+    Output (dict):
+    {commands: [{command, collection, count, failures, slow, seconds, max_seconds, mean_ms, reply_documents,
+                 reply_bytes}, ....],
+     pool: {created, closed, checked_out, checked_in, checkout_failed, cleared, in_use, max_in_use,
+            wait_count, wait_seconds, max_wait_seconds, mean_wait_ms},
+     recent: [{command, collection, seconds, reply_documents, reply_bytes, failed, failure, connection_id, ....},
+              ....]}
+
+    reply_bytes stays 0 unless MONGO_REPLY_SIZES=1
+    """
+    with lock:
+        command_stats = [{'command': command, 'collection': collection, **stats,
+                          'mean_ms': stats['seconds'] / stats['count'] * 1000 if stats['count'] else 0.0}
+                         for (command, collection), stats in commands.items()]
+        pool_stats = {**pool, 'mean_wait_ms': pool['wait_seconds'] / pool['wait_count'] * 1000
+                      if pool['wait_count'] else 0.0}
+        last = list(recent)[-recent_count:]
+
+    return {'commands': sorted(command_stats, key=lambda stats: -stats['seconds']), 'pool': pool_stats,
+            'recent': last}
@@ -0,0 +1,96 @@
+import os
+import heapq
+from backend.DB import pairs_reads
+from backend.pipelines import aggregate, find
+from backend.cache import cached
+
+########################################################################################################################
+# 'exact' groups the pair counts on the server, 'space_saving' streams them through a bounded heavy-hitters sketch
+top_k_mode = os.environ.get('PAIR_TOP_K_MODE', 'exact')
+sketch_size = int(os.environ.get('PAIR_SKETCH_SIZE', 1000))
+
+
+def space_saving(stream, capacity):
+    """
+    Space-Saving heavy hitters over a stream of (item, count) tuples, keeping at most capacity counters
+
+    Output (dict):
+    {item: [count, error], ....}
+
+    Where count overestimates the true count of item by at most error
+    """
+    counters = {}
+    heap = []
+
+    for item, count in stream:
+        if item in counters:
+            counters[item][0] += count
+        elif len(counters) < capacity:
+            counters[item] = [count, 0]
+        else:
+            # Evict the smallest counter, heap entries whose count changed since they were pushed are stale
+            while True:
+                smallest, victim = heapq.heappop(heap)
+                if victim in counters and counters[victim][0] == smallest:
+                    break
+            del counters[victim]
+            counters[item] = [smallest + count, smallest]
+
+        heapq.heappush(heap, (counters[item][0], item))
+
+        if len(heap) > 4 * capacity:
+            heap = [(counter[0], key) for key, counter in counters.items()]
+            heapq.heapify(heap)
+
+    return counters
+
+
+def pair_filter(bot_year, top_year, country_list):
+    return {'YEAR': {'$gte': bot_year, '$lte': top_year}, 'ISO_COUNTRY_CODE': {'$in': list(country_list)}}
+
+
+def exact_top_pairs(bot_year, top_year, country_list, k):
+    group = {
+        '$group': {
+            '_id': {'company': '$CAE_NAME', 'winner': '$WIN_NAME'},
+            'count': {'$sum': '$count'}
+        }}
+
+    pipeline = [
+        {'$match': pair_filter(bot_year, top_year, country_list)},
+        group,
+        {'$sort': {'count': -1}},
+        {'$limit': k}
+    ]
+
+    return [((document['_id']['company'], document['_id']['winner']), document['count'])
+            for document in aggregate(pairs_reads, pipeline)]
+
+
+def sketch_top_pairs(bot_year, top_year, country_list, k):
+    projection = {'_id': 0, 'CAE_NAME': 1, 'WIN_NAME': 1, 'count': 1}
+    cursor = find(pairs_reads, pair_filter(bot_year, top_year, country_list), projection)
+
+    counters = space_saving((((document['CAE_NAME'], document['WIN_NAME']), document['count']) for document in cursor),
+                            sketch_size)
+
+    return [(pair, counter[0]) for pair, counter in heapq.nlargest(k, counters.items(), key=lambda item: item[1][0])]
+
+
+@cached
+def top_pairs(bot_year, top_year, country_list, k=5):
+    """
+    Returns the k most frequent co-occurring companies ('CAE_NAME' and 'WIN_NAME') of the pair counts collection,
+    cached with the query results (dropped by backend.cache.invalidate when contracts of the filter are inserted)
+
+    Output (list of documents):
+    [{companies: 'CAE_NAME with WIN_NAME', count: value}, ....]
+    """
+    if top_k_mode == 'space_saving':
+        top = sketch_top_pairs(bot_year, top_year, country_list, k)
+    else:
+        top = exact_top_pairs(bot_year, top_year, country_list, k)
+
+    list_documents = [{'companies': f'{company} with {winner}', 'count': count} for (company, winner), count in top]
+
+    return list_documents
@@ -1,8 +1,17 @@
 import backend.DB as DB
+from backend.queries import query_list, countries
+from backend.cache import bypass, cache_stats
+from backend.streaming import stream_insert
+from backend.benchmark import benchmark
+from backend.indexes import explain_query
+from backend.pipelines import tagged
+from backend.profiler import profiling, harvest
+from backend.memory import measure_memory
+from contextlib import ExitStack
+from datetime import datetime
 import json
-from backend.queries import query_list
-from backend.queries import insert_operation
 import time
+import uuid
 
 def get_collection_count():
     return DB.eu.count()
@@ -11,32 +20,125 @@ def get_collection_stats():
     stats = DB.db.command("collstats", "eu")
     return {k: stats[k] for k in ('count', 'nindexes', 'size')} 
 
-def insert_json(json_obj):
+def get_cache_stats():
+    stats = cache_stats()
+    return {k: stats[k] for k in ('hits', 'misses', 'coalesced', 'entries', 'bytes', 'generation')}
+
+def insert_json(chunks):
+    # chunks of a JSON array or NDJSON file (bytes or str also work), parsed and inserted in batches
+    if isinstance(chunks, (bytes, str)):
+        chunks = [chunks]
     start = time.process_time()
-    json_decode = json.loads(json_obj)
-    inserted = insert_operation(json_decode)
+    report = stream_insert(chunks)
     time_elapsed = time.process_time() - start
-    return (inserted, time_elapsed)
+    return (report, time_elapsed)
+
+def get_latest_run():
+    return DB.performance_runs.find_one({}, {'_id': 0}, sort=[('started', -1)])
+
+def save_run(run):
+    # pipelines are stored as JSON, their '$' operators are not valid field names
+    for query in run['queries']:
+        for plan in query['plans']:
+            plan['pipeline'] = json.dumps(plan['pipeline'], default=str)
+    DB.performance_runs.insert_one(run)
+
+def explain_plans(fn):
+    # Explained after the timed run, the explain runs the pipelines again
+    try:
+        return explain_query(fn), None
+    except Exception as e:
+        return [], str(e)
+
+def harvest_profile(run):
+    try:
+        return harvest(run['run_id']), None
+    except Exception as e:
+        return None, str(e)
 
-def performance_evaluation():
+# Filters the figure builders are called with in memory mode, the defaults of the queries
+figure_filters = (2008, 2020, countries)
+
+def memory_usage(fn, *args):
+    # Measured in a separate call, tracemalloc slows the timed one down
+    try:
+        with bypass():
+            return measure_memory(fn, *args), None
+    except Exception as e:
+        return None, str(e)
+
+def performance_evaluation(profile=False, memory=False, figures=()):
+    # profile enables the database profiler for the run (PROFILE_LEVEL, PROFILE_SLOWMS), every command of
+    # the run is tagged with a '<run id>:<query name>' comment to find its system.profile entries
+    # memory records the peak and retained Python memory of every query and of the figure builders
+    # (apps/dcc_functions.figure_list, passed by the home page to keep backend free of the Dash apps)
     start_time = time.time()
+    run = {'run_id': uuid.uuid4().hex[:12], 'started': datetime.now(), 'state': 'running', 'seconds': None,
+           'queries': [], 'figures': [], 'profile': None, 'profile_error': None}
     print("Started performance evaluation", flush=True)
     print("", flush=True)
-    for num, fn in enumerate(query_list):
-        with open(".query.state", 'w+') as file:
-            percent = (num / len(query_list)) * 100 
-            file.write(f"{str(percent)}: Running {fn.__name__}")
-        query_start = time.time()
+    # The previous profiling level is restored when the block exits
+    with ExitStack() as stack:
         try:
-            fn()
-        except:
+            if profile:
+                stack.enter_context(profiling())
+        except Exception as e:
             with open(".query.state", 'w+') as file:
-                file.write(f"100:Error - Query {fn.__name__} failed")
+                file.write(f"100:Error - Could not enable the database profiler: {e}")
             return
-        print(f"Finished iteration {num+1} of {len(query_list)} (time elapsed {(time.time() - query_start):.1f}s) func: {fn.__name__} ", flush=True)
+        for num, fn in enumerate(query_list):
+            with open(".query.state", 'w+') as file:
+                percent = (num / len(query_list)) * 100 
+                file.write(f"{str(percent)}: Running {fn.__name__}")
+            query_start = time.time()
+            try:
+                # Time the database work, not the query result cache
+                with bypass(), tagged(f"{run['run_id']}:{fn.__name__}"):
+                    fn()
+            except:
+                with open(".query.state", 'w+') as file:
+                    file.write(f"100:Error - Query {fn.__name__} failed")
+                run['state'] = 'failed'
+                save_run(run)
+                return
+            query_time = time.time() - query_start
+            plans, explain_error = explain_plans(fn)
+            usage, memory_error = memory_usage(fn) if memory else (None, None)
+            run['queries'].append({'query': fn.__name__, 'seconds': query_time, 'plans': plans,
+                                   'explain_error': explain_error, 'memory': usage, 'memory_error': memory_error})
+            print(f"Finished iteration {num+1} of {len(query_list)} (time elapsed {query_time:.1f}s) func: {fn.__name__} ", flush=True)
+        for num, builder in enumerate(figures if memory else ()):
+            with open(".query.state", 'w+') as file:
+                file.write(f"{str((num / len(figures)) * 100)}: Measuring the memory of {builder.__name__}")
+            usage, memory_error = memory_usage(builder, *figure_filters)
+            run['figures'].append({'figure': builder.__name__, 'memory': usage, 'memory_error': memory_error})
     print("Finished performance evaluation", flush=True)
     print("", flush=True)
 
     time_elapsed = (time.time() - start_time)
+    run['state'], run['seconds'] = 'done', time_elapsed
+    if profile:
+        run['profile'], run['profile_error'] = harvest_profile(run)
+    save_run(run)
     with open(".query.state", 'w+') as file:
         file.write(f"100:Done - Time elapsed {time_elapsed:.3f} seconds")
+
+def benchmark_evaluation():
+    print("Started benchmark", flush=True)
+
+    def progress(percent, message):
+        with open(".query.state", 'w+') as file:
+            file.write(f"{str(percent)}:{message}")
+
+    try:
+        report = benchmark(progress=progress)
+    except Exception as e:
+        with open(".query.state", 'w+') as file:
+            file.write(f"100:Error - Benchmark failed: {e}")
+        return
+
+    print("Finished benchmark", flush=True)
+    regressions = report['regressions']
+    compared = 'no baseline' if regressions is None else f"{len(regressions)} regressions against the baseline"
+    with open(".query.state", 'w+') as file:
+        file.write(f"100:Done - Benchmark report saved ({compared})")
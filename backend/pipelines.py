@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from threading import local
+from pymongo import ReadPreference
+from backend.tracing import open_span, close_span
+
+########################################################################################################################
+# Every query reads the database through aggregate/find below, so the pipelines can be captured instead of executed
+state = local()
+
+
+def capturing():
+    return getattr(state, 'captured', None) is not None
+
+
+def options():
+    """
+    Returns the command options of this thread, the comment tagging its commands (see tagged below)
+    """
+    tag = getattr(state, 'comment', None)
+    return {'comment': tag} if tag is not None else {}
+
+
+def reading(collection):
+    """
+    Returns collection, read from the primary inside a primary_reads block
+    """
+    if getattr(state, 'primary', False) and collection.read_preference != ReadPreference.PRIMARY:
+        return collection.with_options(read_preference=ReadPreference.PRIMARY)
+    return collection
+
+
+def aggregate(collection, pipeline):
+    """
+    Runs pipeline on collection and returns the list of documents (nothing is run while capturing)
+    """
+    if capturing():
+        state.captured.append((collection, pipeline))
+        return []
+
+    opened = open_span('mongodb', f'{collection.name}.aggregate')
+    try:
+        return list(reading(collection).aggregate(pipeline, **options()))
+    finally:
+        close_span(opened)
+
+
+def find(collection, filter_, projection=None):
+    """
+    Returns a cursor over the documents of collection matching filter_ (an empty list while capturing)
+    """
+    if capturing():
+        state.captured.append((collection, [{'$match': filter_}]))
+        return []
+
+    return reading(collection).find(filter_, projection, **options())
+
+
+@contextmanager
+def capture():
+    """
+    Collects the (collection, pipeline) of every aggregate/find call made by this thread inside the block
+    """
+    state.captured = []
+    try:
+        yield state.captured
+    finally:
+        state.captured = None
+
+
+@contextmanager
+def tagged(comment):
+    """
+    Sends comment with every aggregate/find command of this thread inside the block (shown by the profiler,
+    currentOp and the server logs)
+    """
+    state.comment = comment
+    try:
+        yield
+    finally:
+        state.comment = None
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the aggregate/find commands of this thread inside the block to the primary, whatever the read preference
+    of their collection (reads that must see the latest writes, the database profiler of the primary)
+    """
+    previous = getattr(state, 'primary', False)
+    state.primary = True
+    try:
+        yield
+    finally:
+        state.primary = previous
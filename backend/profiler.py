@@ -0,0 +1,73 @@
+import os
+import re
+from contextlib import contextmanager
+from backend.DB import db
+from backend.pipelines import primary_reads
+
+########################################################################################################################
+# Database profiler for evaluation runs, the commands of a run are tagged with a '<run id>:<query name>' comment
+level = int(os.environ.get('PROFILE_LEVEL', 1))
+slowms = int(os.environ.get('PROFILE_SLOWMS', 0))
+
+
+def profile_status():
+    """
+    Returns the current profiling level and slowms of the database ({was: level, slowms: ms, ....})
+    """
+    return db.command('profile', -1)
+
+
+@contextmanager
+def profiling(level=level, slowms=slowms):
+    """
+    Enables the profiler (level 1 records operations slower than slowms, level 2 all of them) inside the block
+    and restores the previous level and slowms after it
+
+    The profiler and system.profile are those of the primary, the queries of this thread inside the block are
+    sent to the primary too (instead of the secondaries of MONGO_READ_PREFERENCE) so harvest finds them
+    """
+    previous = profile_status()
+    db.command('profile', level, slowms=slowms)
+    try:
+        with primary_reads():
+            yield
+    finally:
+        db.command('profile', previous['was'], slowms=previous['slowms'])
+
+
+def entry_tag(entry):
+    """
+    Returns the comment of a system.profile entry, a getMore carries it in its originating command
+    """
+    for command in (entry.get('command', {}), entry.get('originatingCommand', {})):
+        if isinstance(command.get('comment'), str):
+            return command['comment']
+    return None
+
+
+def harvest(run_id):
+    """
+    Sums the system.profile entries of the run per query, server side times exclude the driver and the network
+
+    Expected Output (dict):
+    {query name: {operations, millis, planningMillis, yields, bytesRead, docsExamined, keysExamined, nreturned,
+                  responseLength}, ....}
+    """
+    tag = re.compile(f'^{re.escape(run_id)}:')
+    entries = db.system.profile.find({'$or': [{'command.comment': tag}, {'originatingCommand.comment': tag}]})
+
+    summary = {}
+    for entry in entries:
+        query = entry_tag(entry).split(':', 1)[1]
+        stats = summary.setdefault(query, {'operations': 0, 'millis': 0, 'planningMillis': 0.0, 'yields': 0,
+                                           'bytesRead': 0, 'docsExamined': 0, 'keysExamined': 0, 'nreturned': 0,
+                                           'responseLength': 0})
+        stats['operations'] += 1
+        stats['millis'] += entry.get('millis', 0)
+        stats['planningMillis'] += entry.get('planningTimeMicros', 0) / 1000
+        stats['yields'] += entry.get('numYield', 0)
+        stats['bytesRead'] += entry.get('storage', {}).get('data', {}).get('bytesRead', 0)
+        for field in ('docsExamined', 'keysExamined', 'nreturned', 'responseLength'):
+            stats[field] += entry.get(field, 0)
+
+    return summary
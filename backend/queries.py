@@ -1,7 +1,18 @@
 import pandas as pd
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 from backend.DB import eu
 from backend.DB import db
+from backend.DB import eu_reads
+from backend.DB import rollup_reads
+from backend.DB import business_rollup_reads
+from backend.rollups import update_rollups, hist_buckets
+from backend.ingest import derive
+from backend.pairs import top_pairs
+from backend.pipelines import aggregate
+from backend.dimensions import cpv_names, country_names
+from backend.cache import cached, invalidate
+from backend.metrics import instrumented
 
 ########################################################################################################################
 countries = ['NO', 'HR', 'HU', 'CH', 'CZ', 'RO', 'LV', 'GR', 'UK', 'SI', 'LT',
@@ -9,6 +20,290 @@ countries = ['NO', 'HR', 'HU', 'CH', 'CZ', 'RO', 'LV', 'GR', 'UK', 'SI', 'LT',
              'BG', 'CY', 'AT', 'LU', 'BE', 'FI', 'EE', 'SK', 'MT', 'LI', 'IS']
 
 
+stat_fields = ['count', 'value_count', 'value_sum', 'offers_count', 'offers_sum',
+               'time_diff_count', 'time_diff_sum', 'value_diff_count', 'value_diff_sum']
+
+
+def rollup_filter(bot_year, top_year, country_list, **fields):
+    """
+    Returns the '$match' stage selecting the rollup documents of the year range and countries (plus any extra fields)
+    """
+    filter_ = {
+        '$match': {
+            'YEAR': {'$gte': bot_year, '$lte': top_year},
+            'ISO_COUNTRY_CODE': {'$in': list(country_list)},
+            **fields
+        }}
+
+    return filter_
+
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def totals(rows, key):
+    """
+    Sums the statistics of rows per key(row)
+
+    Output (dict):
+    {key: {stat_1: sum_1, ...}, ....}
+    """
+    groups = {}
+
+    for row in rows:
+        total = groups.setdefault(key(row), dict.fromkeys(stat_fields, 0))
+        for field in stat_fields:
+            total[field] += row.get(field, 0)
+
+    return groups
+
+
+def box(rows, key):
+    """
+    Returns the five box metrics (see ex1_cpv_box) averaged over the groups of key(row)
+    """
+    groups = totals(rows, key)
+    y_eu = totals([row for row in rows if row['eu'] == 'Y'], key)
+    n_eu = totals([row for row in rows if row['eu'] == 'N'], key)
+
+    return (mean(ratio(group['value_sum'], group['value_count']) for group in groups.values()),
+            mean(group['count'] for group in groups.values()),
+            mean(ratio(group['offers_sum'], group['offers_count']) for group in groups.values()),
+            mean(ratio(group['value_sum'], group['value_count']) for group in y_eu.values()),
+            mean(ratio(group['value_sum'], group['value_count']) for group in n_eu.values()))
+
+
+def averages(rows, key, highest=True, limit=5):
+    """
+    Returns [(key, average 'VALUE_EURO'), ....] of the highest (or lowest) limit groups of key(row)
+    """
+    groups = totals(rows, key)
+
+    ranked = sorted(((group_key, group['value_sum'] / group['value_count'])
+                     for group_key, group in groups.items() if group['value_count']),
+                    key=lambda item: item[1], reverse=highest)
+
+    return ranked[:limit]
+
+
+def histogram(counts):
+    """
+    Returns the ex8_cpv_hist documents of the {bucket: count} counts of a CPV Division
+    """
+    return [{'bucket': bucket, 'count': counts.get(str(bucket), 0)} for bucket in hist_buckets] + \
+           [{'bucket': 'Other', 'count': counts.get('Other', 0)}]
+
+
+def rollup_scan(bot_year, top_year, country_list, histogram=True):
+    """
+    Scans the rollup documents of the filter once, splitting the scan with a '$facet' in
+
+    groups: statistics per CPV Division, country and 'B_EU_FUNDS'
+    hist: 'VALUE_EURO' histogram counts per CPV Division and bucket (an empty dict without histogram)
+    """
+    groups = [
+        {'$group': {
+            '_id': {'cpv': '$CPV_DIVISION', 'country': '$ISO_COUNTRY_CODE', 'eu': '$B_EU_FUNDS'},
+            **{field: {'$sum': '$' + field} for field in stat_fields}
+        }}
+    ]
+
+    facets = {'groups': groups}
+    if histogram:
+        facets['hist'] = [
+            {'$project': {'cpv': '$CPV_DIVISION', 'hist': {'$objectToArray': '$hist'}}},
+            {'$unwind': '$hist'},
+            {'$group': {'_id': {'cpv': '$cpv', 'bucket': '$hist.k'}, 'count': {'$sum': '$hist.v'}}}
+        ]
+
+    pipeline = [rollup_filter(bot_year, top_year, country_list), {'$facet': facets}]
+
+    list_documents = aggregate(rollup_reads, pipeline) or [{'groups': [], 'hist': []}]
+
+    rows = [{**document.pop('_id'), **document} for document in list_documents[0]['groups']]
+
+    hist = {}
+    for document in list_documents[0].get('hist', []):
+        hist.setdefault(document['_id']['cpv'], {})[document['_id']['bucket']] = document['count']
+
+    return rows, hist
+
+
+@cached
+def cpv_page(bot_year=2008, top_year=2020, country_list=countries):
+    """
+    Returns every CPV page result from a single scan of the rollup collection
+
+    Expected Output (dict):
+    {box: ex1, treemap: ex2, bar_1: ex3, bar_2: ex4, bar_3: ex5, bar_4: ex6, map: ex7, hist: {cpv: ex8}, bar_diff: ex9}
+    """
+    rows, hist = rollup_scan(bot_year, top_year, country_list)
+
+    cpv = cpv_names()
+    country = country_names()
+
+    def cpv_averages(rows, highest):
+        return [{'cpv': cpv.get(code, code), 'avg': avg}
+                for code, avg in averages(rows, lambda row: row['cpv'], highest)]
+
+    highest_per_country = {}
+    for (country_code, code), avg in averages(rows, lambda row: (row['country'], row['cpv']), limit=None):
+        highest_per_country.setdefault(country_code, (code, avg))
+
+    differences = [(code, ratio(group['time_diff_sum'], group['time_diff_count']),
+                    ratio(group['value_diff_sum'], group['value_diff_count']))
+                   for code, group in totals(rows, lambda row: row['cpv']).items() if group['time_diff_count']]
+    differences.sort(key=lambda item: item[1], reverse=True)
+
+    page = {
+        'box': box(rows, lambda row: row['cpv']),
+        'treemap': [{'cpv': cpv.get(code, code), 'count': group['count']}
+                    for code, group in totals(rows, lambda row: row['cpv']).items()],
+        'bar_1': cpv_averages(rows, True),
+        'bar_2': cpv_averages(rows, False),
+        'bar_3': cpv_averages([row for row in rows if row['eu'] == 'Y'], True),
+        'bar_4': cpv_averages([row for row in rows if row['eu'] == 'N'], True),
+        'map': [{'cpv': cpv.get(code, code), 'avg': avg, 'country': country.get(country_code, country_code)}
+                for country_code, (code, avg) in highest_per_country.items()],
+        'hist': {code: histogram(counts) for code, counts in hist.items()},
+        'bar_diff': [{'cpv': cpv.get(code, code), 'time_difference': time_difference,
+                      'value_difference': value_difference}
+                     for code, time_difference, value_difference in differences[:5]],
+    }
+
+    return page
+
+
+@cached
+def country_page(bot_year=2008, top_year=2020, country_list=countries):
+    """
+    Returns every country page result from a single scan of the rollup collection
+
+    Expected Output (dict):
+    {box: ex10, treemap: ex11, bar_1: ex12, bar_2: ex13, map: ex14}
+    """
+    rows, _ = rollup_scan(bot_year, top_year, country_list, histogram=False)
+
+    country = country_names()
+
+    def country_averages(highest):
+        return [{'country': country.get(code, code), 'avg': avg}
+                for code, avg in averages(rows, lambda row: row['country'], highest)]
+
+    page = {
+        'box': box(rows, lambda row: row['country']),
+        'treemap': [{'country': country.get(code, code), 'count': group['count']}
+                    for code, group in totals(rows, lambda row: row['country']).items()],
+        'bar_1': country_averages(True),
+        'bar_2': country_averages(False),
+        'map': [{'sum': group['value_sum'], 'country': country.get(code, code)}
+                for code, group in totals([row for row in rows if row['eu'] == 'Y'],
+                                          lambda row: row['country']).items()],
+    }
+
+    return page
+
+
+def company_totals(*fields):
+    """
+    Returns the '$group' stage summing fields per company ('CAE_NAME') over every country and 'B_EU_FUNDS'
+    """
+    return {'$group': {'_id': '$CAE_NAME', **{field: {'$sum': '$' + field} for field in fields}}}
+
+
+def company_ratio(numerator, denominator):
+    return {'$cond': [{'$gt': ['$' + denominator, 0]}, {'$divide': ['$' + numerator, '$' + denominator]}, None]}
+
+
+def box_facet(match=None):
+    """
+    Returns the '$facet' branch of the business box metrics, averages of the per company ratios ('$avg' skips nulls)
+    """
+    return ([{'$match': match}] if match else []) + [
+        company_totals('count', 'value_sum', 'value_count', 'offers_sum', 'offers_count'),
+        {'$group': {'_id': None,
+                    'value': {'$avg': company_ratio('value_sum', 'value_count')},
+                    'count': {'$avg': '$count'},
+                    'offers': {'$avg': company_ratio('offers_sum', 'offers_count')}}}
+    ]
+
+
+def ranked_facet(highest, limit=5):
+    """
+    Returns the '$facet' branch of the limit companies with the highest (or lowest) average 'VALUE_EURO'
+    """
+    return [
+        company_totals('value_sum', 'value_count'),
+        {'$match': {'value_count': {'$gt': 0}}},
+        {'$project': {'avg': {'$divide': ['$value_sum', '$value_count']}}},
+        {'$sort': {'avg': -1 if highest else 1, '_id': 1}},
+        {'$limit': limit}
+    ]
+
+
+@cached
+def business_page(bot_year=2008, top_year=2020, country_list=countries):
+    """
+    Returns the business page results (ex20 reads the pair counts, see backend/pairs.py) from a single scan
+    of the company rollup collection, every widget is ranked and limited on the server in its '$facet' branch
+
+    Expected Output (dict):
+    {box: ex15, bar_1: ex16, bar_2: ex17, treemap: ex18, map: ex19}
+    """
+    facets = {
+        'box': box_facet(),
+        'box_y_eu': box_facet({'B_EU_FUNDS': 'Y'}),
+        'box_n_eu': box_facet({'B_EU_FUNDS': 'N'}),
+        'bar_1': ranked_facet(True),
+        'bar_2': ranked_facet(False),
+        'treemap': [
+            company_totals('count'),
+            {'$sort': {'count': -1, '_id': 1}},
+            {'$limit': 15}
+        ],
+        'map': [
+            {'$group': {'_id': {'country': '$ISO_COUNTRY_CODE', 'company': '$CAE_NAME'},
+                        'value_sum': {'$sum': '$value_sum'},
+                        'address': {'$max': '$address'}}},
+            {'$sort': {'value_sum': -1, '_id.company': 1}},
+            {'$group': {'_id': '$_id.country',
+                        'company': {'$first': '$_id.company'},
+                        'sum': {'$first': '$value_sum'},
+                        'address': {'$first': '$address'}}},
+            {'$sort': {'sum': -1, '_id': 1}}
+        ],
+    }
+
+    pipeline = [rollup_filter(bot_year, top_year, country_list), {'$facet': facets}]
+
+    list_documents = aggregate(business_rollup_reads, pipeline) or [dict.fromkeys(facets, [])]
+    result = list_documents[0]
+
+    country = country_names()
+
+    def box_values(name):
+        return result[name][0] if result[name] else {}
+
+    page = {
+        'box': (box_values('box').get('value'), box_values('box').get('count'), box_values('box').get('offers'),
+                box_values('box_y_eu').get('value'), box_values('box_n_eu').get('value')),
+        'bar_1': [{'company': document['_id'], 'avg': document['avg']} for document in result['bar_1']],
+        'bar_2': [{'company': document['_id'], 'avg': document['avg']} for document in result['bar_2']],
+        'treemap': [{'company': document['_id'], 'count': document['count']} for document in result['treemap']],
+        'map': [{'company': document['company'], 'sum': document['sum'],
+                 'country': country.get(document['_id'], document['_id']), 'address': document.get('address')}
+                for document in result['map']],
+    }
+
+    return page
+
+
 def ex0_cpv_example(bot_year=2008, top_year=2020):
     """
     Returns all contracts in given year 'YEAR' range and cap to 100000000 the 'VALUE_EURO'
@@ -32,11 +327,13 @@ def ex0_cpv_example(bot_year=2008, top_year=2020):
 
     pipeline = [year_filter(bot_year, top_year), count]
 
-    list_documents = list(eu.aggregate(pipeline))
+    list_documents = aggregate(eu_reads, pipeline)
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex1_cpv_box(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns five metrics, described below
@@ -53,15 +350,14 @@ def ex1_cpv_box(bot_year=2008, top_year=2020, country_list=countries):
     avg_cpv_euro_avg_n_eu = average value of each CPV's division contracts average 'VALUE_EURO' with out 'B_EU_FUNDS' (int)
     """
 
-    avg_cpv_euro_avg = None
-    avg_cpv_count = None
-    avg_cpv_offer_avg = None
-    avg_cpv_euro_avg_y_eu = None
-    avg_cpv_euro_avg_n_eu = None
+    avg_cpv_euro_avg, avg_cpv_count, avg_cpv_offer_avg, avg_cpv_euro_avg_y_eu, avg_cpv_euro_avg_n_eu = \
+        cpv_page(bot_year, top_year, country_list)['box']
 
     return avg_cpv_euro_avg, avg_cpv_count, avg_cpv_offer_avg, avg_cpv_euro_avg_y_eu, avg_cpv_euro_avg_n_eu
 
 
+@instrumented('query')
+@cached
 def ex2_cpv_treemap(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the count of contracts for each CPV Division
@@ -75,13 +371,13 @@ def ex2_cpv_treemap(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = contract count of each CPV Division, (int)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['treemap']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex3_cpv_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     """
     Per CPV Division and get the average 'VALUE_EURO' return the highest 5 cpvs
@@ -95,13 +391,13 @@ def ex3_cpv_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each CPV Division, (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['bar_1']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex4_cpv_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     """
     Per CPV Division and get the average 'VALUE_EURO' return the lowest 5 cpvs
@@ -115,13 +411,13 @@ def ex4_cpv_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each CPV Division, (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['bar_2']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex5_cpv_bar_3(bot_year=2008, top_year=2020, country_list=countries):
     """
     Per CPV Division and get the average 'VALUE_EURO' return the highest 5 cpvs for contracts which recieved european funds ('B_EU_FUNDS') 
@@ -135,13 +431,13 @@ def ex5_cpv_bar_3(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each CPV Division, (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['bar_3']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex6_cpv_bar_4(bot_year=2008, top_year=2020, country_list=countries):
     """
     Per CPV Division and get the average 'VALUE_EURO' return the highest 5 cpvs for contracts which did not recieve european funds ('B_EU_FUNDS') 
@@ -155,14 +451,13 @@ def ex6_cpv_bar_4(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each CPV Division, (float)
     """
 
-
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['bar_4']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex7_cpv_map(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the highest CPV Division on average 'VALUE_EURO' per country 'ISO_COUNTRY_CODE'
@@ -178,13 +473,13 @@ def ex7_cpv_map(bot_year=2008, top_year=2020, country_list=countries):
     value_3 = country in ISO-A2 format (string) (located in iso_codes collection)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['map']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex8_cpv_hist(bot_year=2008, top_year=2020, country_list=countries, cpv='50'):
     """
     Produce an histogram where each bucket has the contract counts of a particular cpv
@@ -217,13 +512,13 @@ def ex8_cpv_hist(bot_year=2008, top_year=2020, country_list=countries, cpv='50')
     value_2 = contract count for thar particular bucket, (int)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['hist'].get(cpv, histogram({}))
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex9_cpv_bar_diff(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the average time and value difference for each CPV, return the highest 5 cpvs
@@ -242,13 +537,13 @@ def ex9_cpv_bar_diff(bot_year=2008, top_year=2020, country_list=countries):
     value_3 = average 'EURO_AWARD' - 'VALUE_EURO' (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = cpv_page(bot_year, top_year, country_list)['bar_diff']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex10_country_box(bot_year=2008, top_year=2020, country_list=countries):
     """
     We want five numbers, described below
@@ -265,15 +560,14 @@ def ex10_country_box(bot_year=2008, top_year=2020, country_list=countries):
     avg_country_euro_avg_n_eu = average value of each countries ('ISO_COUNTRY_CODE') contracts average 'VALUE_EURO' with out 'B_EU_FUNDS' (int)
     """
 
-    avg_country_euro_avg = None
-    avg_country_count = None
-    avg_country_offer_avg = None
-    avg_country_euro_avg_y_eu = None
-    avg_country_euro_avg_n_eu = None
+    avg_country_euro_avg, avg_country_count, avg_country_offer_avg, avg_country_euro_avg_y_eu, \
+        avg_country_euro_avg_n_eu = country_page(bot_year, top_year, country_list)['box']
 
     return avg_country_euro_avg, avg_country_count, avg_country_offer_avg, avg_country_euro_avg_y_eu, avg_country_euro_avg_n_eu
 
 
+@instrumented('query')
+@cached
 def ex11_country_treemap(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the count of contracts per country ('ISO_COUNTRY_CODE')
@@ -287,13 +581,13 @@ def ex11_country_treemap(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = contract count of each country, (int)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = country_page(bot_year, top_year, country_list)['treemap']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex12_country_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the average 'VALUE_EURO' for each country, return the highest 5 countries
@@ -308,13 +602,13 @@ def ex12_country_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each country ('ISO_COUNTRY_CODE') name, (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = country_page(bot_year, top_year, country_list)['bar_1']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex13_country_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     """
     Group by country and get the average 'VALUE_EURO' for each group, return the lowest, average wise, 5 documents
@@ -329,13 +623,13 @@ def ex13_country_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each country ('ISO_COUNTRY_CODE') name, (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = country_page(bot_year, top_year, country_list)['bar_2']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex14_country_map(bot_year=2008, top_year=2020, country_list=countries):
     """
     For each country get the sum of the respective contracts 'VALUE_EURO' with 'B_EU_FUNDS'
@@ -350,13 +644,13 @@ def ex14_country_map(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = country in ISO-A2 format (string) (located in iso_codes collection)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = country_page(bot_year, top_year, country_list)['map']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex15_business_box(bot_year=2008, top_year=2020, country_list=countries):
     """
     We want five numbers, described below
@@ -374,15 +668,14 @@ def ex15_business_box(bot_year=2008, top_year=2020, country_list=countries):
     avg_business_euro_avg_n_eu = average value of each company ('CAE_NAME') contracts average 'VALUE_EURO' with out 'B_EU_FUNDS' (int)
     """
 
-    avg_business_euro_avg = None
-    avg_business_count = None
-    avg_business_offer_avg = None
-    avg_business_euro_avg_y_eu = None
-    avg_business_euro_avg_n_eu = None
+    avg_business_euro_avg, avg_business_count, avg_business_offer_avg, avg_business_euro_avg_y_eu, \
+        avg_business_euro_avg_n_eu = business_page(bot_year, top_year, country_list)['box']
 
     return avg_business_euro_avg, avg_business_count, avg_business_offer_avg, avg_business_euro_avg_y_eu, avg_business_euro_avg_n_eu
 
 
+@instrumented('query')
+@cached
 def ex16_business_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the average 'VALUE_EURO' for company ('CAE_NAME') return the highest 5 companies
@@ -396,11 +689,13 @@ def ex16_business_bar_1(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each company ('CAE_NAME'), (float)
     """
 
-    list_documents = ex3_cpv_bar_1(bot_year=2008, top_year=2020, country_list=countries)
+    list_documents = business_page(bot_year, top_year, country_list)['bar_1']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex17_business_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     """
     Returns the average 'VALUE_EURO' for company ('CAE_NAME') return the lowest 5 companies
@@ -416,13 +711,13 @@ def ex17_business_bar_2(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = average 'VALUE_EURO' of each company ('CAE_NAME'), (float)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = business_page(bot_year, top_year, country_list)['bar_2']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex18_business_treemap(bot_year=2008, top_year=2020, country_list=countries):
     """
     We want the count of contracts for each company 'CAE_NAME', for the highest 15
@@ -436,13 +731,13 @@ def ex18_business_treemap(bot_year=2008, top_year=2020, country_list=countries):
     value_2 = contract count of each company ('CAE_NAME'), (int)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = business_page(bot_year, top_year, country_list)['treemap']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex19_business_map(bot_year=2008, top_year=2020, country_list=countries):
     """
     For each country get the highest company ('CAE_NAME') in terms of 'VALUE_EURO' sum contract spending
@@ -459,13 +754,13 @@ def ex19_business_map(bot_year=2008, top_year=2020, country_list=countries):
     value_4 = company ('CAE_NAME') address, single string merging 'CAE_ADDRESS' and 'CAE_TOWN' separated by ' ' (space)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = business_page(bot_year, top_year, country_list)['map']
 
     return list_documents
 
 
+@instrumented('query')
+@cached
 def ex20_business_connection(bot_year=2008, top_year=2020, country_list=countries):
     """
     We want the top 5 most frequent co-occurring companies ('CAE_NAME' and 'WIN_NAME')
@@ -480,19 +775,35 @@ def ex20_business_connection(bot_year=2008, top_year=2020, country_list=countrie
     value_2 = co-occurring number of contracts (int)
     """
 
-    pipeline = []
-
-    list_documents = []
+    list_documents = top_pairs(bot_year, top_year, country_list)
 
     return list_documents
 
+
 def insert_operation(document):
     '''
         Insert operation.
 
         In case pre computed tables were generated for the queries they should be recomputed with the new data.
+        The derived fields (see backend/ingest.py) are added to every document before it is stored.
+        The rollup collections (see backend/rollups.py) are updated with the new documents in the same call
+        and the cached results of the queries filtering on the new years and countries are dropped.
+        When the insert fails partway the documents inserted before the error are still folded into the rollups.
     '''
-    inserted_ids = eu.insert_many(document).inserted_ids
+    document = [derive(contract) for contract in document]
+
+    try:
+        inserted_ids = eu.insert_many(document).inserted_ids
+    except BulkWriteError as e:
+        # Ordered insert, the first nInserted documents are stored
+        inserted = document[:e.details.get('nInserted', 0)]
+        if inserted:
+            update_rollups(inserted)
+            invalidate(inserted)
+        raise
+
+    update_rollups(document)
+    invalidate(document)
 
     return inserted_ids
 
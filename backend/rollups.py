@@ -0,0 +1,262 @@
+from pymongo import ASCENDING, UpdateOne
+from backend.DB import eu
+from backend.DB import rollup
+from backend.DB import business_rollup
+from backend.DB import pairs
+from backend.ingest import cpv_division, number, days_award_to_dispatch, award_minus_value_euro
+from backend.cache import clear
+
+########################################################################################################################
+rollup_key = ['YEAR', 'ISO_COUNTRY_CODE', 'CPV_DIVISION', 'B_EU_FUNDS']
+
+rollup_fields = ['YEAR', 'ISO_COUNTRY_CODE', 'CPV', 'CPV_DIVISION', 'B_EU_FUNDS', 'EU_FUNDS', 'VALUE_EURO',
+                 'AWARD_VALUE_EURO', 'NUMBER_OFFERS', 'DT_DISPATCH', 'DT_AWARD', 'DAYS_AWARD_TO_DISPATCH',
+                 'AWARD_MINUS_VALUE_EURO']
+
+business_rollup_key = ['CAE_NAME', 'ISO_COUNTRY_CODE', 'YEAR', 'B_EU_FUNDS']
+
+business_rollup_fields = ['CAE_NAME', 'CAE_ADDRESS', 'CAE_TOWN', 'ISO_COUNTRY_CODE', 'YEAR', 'B_EU_FUNDS',
+                          'EU_FUNDS', 'VALUE_EURO', 'NUMBER_OFFERS']
+
+pair_key = ['YEAR', 'ISO_COUNTRY_CODE', 'CAE_NAME', 'WIN_NAME']
+
+# Lower limit of each 'VALUE_EURO' histogram bucket, values outside [0, 1000000[ go to 'Other'
+hist_buckets = list(range(0, 1000000, 100000))
+hist_width = 100000
+
+
+def hist_bucket(value):
+    """
+    Returns the histogram bucket (lower limit as string, or 'Other') of a 'VALUE_EURO'
+    """
+    if value < 0 or value >= hist_buckets[-1] + hist_width:
+        return 'Other'
+    return str(int(value // hist_width) * hist_width)
+
+
+def eu_funds(document):
+    """
+    Returns 'B_EU_FUNDS' as 'Y' or 'N', from the derived 'EU_FUNDS' flag when the document has it
+    """
+    flag = document['EU_FUNDS'] if 'EU_FUNDS' in document else document.get('B_EU_FUNDS') in ('Y', True)
+    return 'Y' if flag else 'N'
+
+
+def division(document):
+    """
+    Returns the CPV Division, from the derived 'CPV_DIVISION' field when the document has it
+    """
+    return document['CPV_DIVISION'] if 'CPV_DIVISION' in document else cpv_division(document.get('CPV'))
+
+
+def merge(total, stats):
+    """
+    Adds stats into total, numbers are summed and strings (like the address) keep the latest value
+    """
+    for field, amount in stats.items():
+        if isinstance(amount, str):
+            total[field] = amount
+        else:
+            total[field] = total.get(field, 0) + amount
+
+
+def precomputed(document, field, fn):
+    """
+    Returns the field precomputed at ingest time, or fn(document) for documents stored before it existed
+    """
+    return document[field] if field in document else fn(document)
+
+
+def rollup_deltas(documents):
+    """
+    Folds contract documents into the increments of each rollup document
+
+    Output (dict):
+    {(YEAR, ISO_COUNTRY_CODE, CPV_DIVISION, B_EU_FUNDS): {stat_1: increment_1, ...}, ....}
+
+    Every statistic is a count or a sum, so deltas of different batches can simply be added together
+    """
+    deltas = {}
+
+    for document in documents:
+        key = (document.get('YEAR'),
+               document.get('ISO_COUNTRY_CODE'),
+               division(document),
+               eu_funds(document))
+
+        stats = deltas.setdefault(key, {})
+
+        def inc(field, amount=1):
+            stats[field] = stats.get(field, 0) + amount
+
+        inc('count')
+
+        value = number(document.get('VALUE_EURO'))
+        if value is not None:
+            inc('value_count')
+            inc('value_sum', value)
+            inc('value_sumsq', value * value)
+            inc('hist.' + hist_bucket(value))
+
+        offers = number(document.get('NUMBER_OFFERS'))
+        if offers is not None:
+            inc('offers_count')
+            inc('offers_sum', offers)
+
+        days = precomputed(document, 'DAYS_AWARD_TO_DISPATCH', days_award_to_dispatch)
+        if days is not None:
+            inc('time_diff_count')
+            inc('time_diff_sum', days)
+
+        value_difference = precomputed(document, 'AWARD_MINUS_VALUE_EURO', award_minus_value_euro)
+        if value_difference is not None:
+            inc('value_diff_count')
+            inc('value_diff_sum', value_difference)
+
+    return deltas
+
+
+def business_rollup_deltas(documents):
+    """
+    Folds contract documents into the increments of each company rollup document
+
+    Output (dict):
+    {(CAE_NAME, ISO_COUNTRY_CODE, YEAR, B_EU_FUNDS): {stat_1: increment_1, ..., 'address': address}, ....}
+
+    Where address is 'CAE_ADDRESS' and 'CAE_TOWN' separated by ' ' (space)
+    """
+    deltas = {}
+
+    for document in documents:
+        key = (document.get('CAE_NAME'),
+               document.get('ISO_COUNTRY_CODE'),
+               document.get('YEAR'),
+               eu_funds(document))
+
+        stats = {'count': 1}
+
+        value = number(document.get('VALUE_EURO'))
+        if value is not None:
+            stats['value_count'] = 1
+            stats['value_sum'] = value
+
+        offers = number(document.get('NUMBER_OFFERS'))
+        if offers is not None:
+            stats['offers_count'] = 1
+            stats['offers_sum'] = offers
+
+        address = ' '.join(str(document[field]) for field in ('CAE_ADDRESS', 'CAE_TOWN') if document.get(field))
+        if address:
+            stats['address'] = address
+
+        merge(deltas.setdefault(key, {}), stats)
+
+    return deltas
+
+
+def pair_deltas(documents):
+    """
+    Counts the co-occurring companies ('CAE_NAME' and 'WIN_NAME') of the contract documents
+
+    Output (dict):
+    {(YEAR, ISO_COUNTRY_CODE, CAE_NAME, WIN_NAME): {'count': increment}, ....}
+    """
+    deltas = {}
+
+    for document in documents:
+        if not document.get('CAE_NAME') or not document.get('WIN_NAME'):
+            continue
+
+        key = tuple(document.get(field) for field in pair_key)
+        merge(deltas.setdefault(key, {}), {'count': 1})
+
+    return deltas
+
+
+# Rollup collections with their key, the eu fields they read and how documents are folded into them
+rollups = [
+    (rollup, rollup_key, rollup_fields, rollup_deltas),
+    (business_rollup, business_rollup_key, business_rollup_fields, business_rollup_deltas),
+    (pairs, pair_key, pair_key, pair_deltas),
+]
+
+
+def update_rollups(documents):
+    """
+    Adds the given contract documents to every rollup collection with one '$inc' upsert per rollup document
+    """
+    for collection, key_fields, _, deltas_fn in rollups:
+        deltas = deltas_fn(documents)
+
+        if not deltas:
+            continue
+
+        operations = []
+        for key, stats in deltas.items():
+            update = {'$inc': {field: amount for field, amount in stats.items() if not isinstance(amount, str)}}
+            latest = {field: amount for field, amount in stats.items() if isinstance(amount, str)}
+            if latest:
+                update['$set'] = latest
+            operations.append(UpdateOne(dict(zip(key_fields, key)), update, upsert=True))
+
+        collection.bulk_write(operations, ordered=False)
+
+
+def ensure_rollup_index(collection, key_fields):
+    collection.create_index([(field, ASCENDING) for field in key_fields], unique=True, name='rollup_key')
+
+
+def rebuild_rollup(collection, key_fields, fields, deltas_fn, batch_size=10000):
+    """
+    Recomputes a rollup collection from every document of the eu collection
+
+    The new rollup is written to a temporary collection and renamed over the old one, so queries never see it half built
+    """
+    deltas = {}
+    batch = []
+
+    def fold(batch):
+        for key, stats in deltas_fn(batch).items():
+            merge(deltas.setdefault(key, {}), stats)
+
+    for document in eu.find({}, {field: 1 for field in fields}).batch_size(batch_size):
+        batch.append(document)
+        if len(batch) == batch_size:
+            fold(batch)
+            batch = []
+    fold(batch)
+
+    staging = collection.database[collection.name + '_staging']
+    staging.drop()
+    ensure_rollup_index(staging, key_fields)
+
+    documents = []
+    for key, stats in deltas.items():
+        document = dict(zip(key_fields, key))
+        for field, amount in stats.items():
+            if field.startswith('hist.'):
+                document.setdefault('hist', {})[field[len('hist.'):]] = amount
+            else:
+                document[field] = amount
+        documents.append(document)
+
+    if documents:
+        staging.insert_many(documents)
+        staging.rename(collection.name, dropTarget=True)
+    else:
+        collection.delete_many({})
+
+    return len(documents)
+
+
+def rebuild_rollups(batch_size=10000):
+    for collection, key_fields, fields, deltas_fn in rollups:
+        count = rebuild_rollup(collection, key_fields, fields, deltas_fn, batch_size)
+        print(f"Rebuilt {collection.name} with {count} documents", flush=True)
+
+    # Every cached result (pages, top pairs) was computed from the previous rollups
+    clear()
+
+
+if __name__ == '__main__':
+    rebuild_rollups()
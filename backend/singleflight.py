@@ -0,0 +1,47 @@
+from threading import Event, Lock
+
+########################################################################################################################
+# Calls currently running per key, concurrent callers of the same key wait for the running call instead of repeating it
+calls = {}
+lock = Lock()
+
+stats = {'calls': 0, 'coalesced': 0}
+
+
+def do(key, fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) unless a call with the same key is already running, in which case its result
+    (or exception) is returned to this caller too
+    """
+    with lock:
+        call = calls.get(key)
+        leader = call is None
+        if leader:
+            call = {'done': Event(), 'result': None, 'error': None}
+            calls[key] = call
+            stats['calls'] += 1
+        else:
+            stats['coalesced'] += 1
+
+    if not leader:
+        call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+    try:
+        call['result'] = fn(*args, **kwargs)
+    except Exception as e:
+        call['error'] = e
+        raise
+    finally:
+        with lock:
+            del calls[key]
+        call['done'].set()
+
+    return call['result']
+
+
+def singleflight_stats():
+    with lock:
+        return {**stats, 'in_flight': len(calls)}
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import base64
+import codecs
+from itertools import chain, islice
+from backend.queries import insert_operation
+
+########################################################################################################################
+# Uploads are parsed and inserted batch by batch, memory depends on the batch and chunk sizes, not on the file size
+batch_size = int(os.environ.get('INGEST_BATCH_SIZE', 1000))
+chunk_size = int(os.environ.get('INGEST_CHUNK_SIZE', 1024 * 1024))
+
+# Same limit as the MongoDB BSON document size, a longer unparsable document is malformed, not incomplete
+max_document = 16 * 1024 * 1024
+
+decoder = json.JSONDecoder()
+whitespace = ' \t\n\r'
+number = '0123456789+-.eE'
+
+
+def read_chunks(file, size=None):
+    """
+    Yields the content of an open (binary or text) file in chunks of size
+    """
+    size = size or chunk_size
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def base64_chunks(content_string, size=None):
+    """
+    Yields the decoded bytes of a base64 string (the dcc.Upload contents) without decoding it all at once
+    """
+    size = (size or chunk_size) // 3 * 4
+    for start in range(0, len(content_string), size):
+        yield base64.b64decode(content_string[start:start + size])
+
+
+def iter_documents(chunks):
+    """
+    Parses a JSON array of documents or NDJSON (one document per line) incrementally from chunks of bytes or text
+
+    A number at the end of a chunk is only parsed once the next chunk (or the end of the data) shows where it ends,
+    a ',' of the array must follow a value. Every document must be a JSON object
+
+    Output (generator of documents):
+    {field: value, ....}, ....
+    """
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    array = None
+    closed = False
+    count = 0
+    # Last token of the array, '[', ',' or 'value' (a ',' or ']' comes after a value, a value after '[' or ',')
+    last = '['
+
+    for chunk, final in chain(((chunk, False) for chunk in chunks), [(b'', True)]):
+        buffer += text.decode(chunk, final=final) if isinstance(chunk, bytes) else chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in whitespace:
+                position += 1
+            if position == len(buffer):
+                break
+
+            if array is None:
+                if buffer[position] == '\ufeff':
+                    position += 1
+                    continue
+                array = buffer[position] == '['
+                if array:
+                    position += 1
+                continue
+
+            if closed:
+                raise ValueError(f"Unexpected data after the end of the array: {buffer[position:position + 20]!r}")
+            if array and buffer[position] in ',]':
+                if last == ',' or (buffer[position] == ',' and last == '['):
+                    raise ValueError(f"Unexpected {buffer[position]!r} without a value before it: "
+                                     f"{buffer[max(position - 10, 0):position + 10]!r}")
+                closed = buffer[position] == ']'
+                last = buffer[position]
+                position += 1
+                continue
+            if array and last == 'value':
+                raise ValueError(f"Expected ',' or ']' after a value: {buffer[position:position + 20]!r}")
+
+            try:
+                document, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final or len(buffer) - position > max_document:
+                    raise
+                # The document continues in the next chunk
+                break
+            if not final and buffer[end - 1] not in '}]"' and not buffer[end:].strip(number):
+                # A number (or literal) ending the chunk may continue in the next one ('1' of '1.5e3')
+                break
+            position = end
+            last = 'value'
+            count += 1
+            if not isinstance(document, dict):
+                raise ValueError(f"document {count} is not an object")
+            yield document
+
+        buffer = buffer[position:]
+
+    if array and not closed:
+        raise ValueError("Unexpected end of data, the JSON array is not closed")
+
+
+def batches(documents, size=None):
+    documents = iter(documents)
+    size = size or batch_size
+    while True:
+        batch = list(islice(documents, size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_insert(chunks, size=None, insert=insert_operation):
+    """
+    Inserts the documents parsed from chunks in batches of size through insert (insert_operation by default)
+
+    Output (dict):
+    {documents: int, batches: int, seconds: float, docs_per_sec: float,
+     batch_seconds: {min: float, mean: float, max: float}}
+    """
+    report = {'documents': 0, 'batches': 0, 'seconds': 0.0, 'docs_per_sec': 0.0,
+              'batch_seconds': {'min': 0.0, 'mean': 0.0, 'max': 0.0}}
+    batch_seconds = report['batch_seconds']
+    start = time.time()
+
+    for batch in batches(iter_documents(chunks), size):
+        batch_start = time.time()
+        insert(batch)
+        elapsed = time.time() - batch_start
+
+        report['batches'] += 1
+        report['documents'] += len(batch)
+        batch_seconds['min'] = elapsed if report['batches'] == 1 else min(batch_seconds['min'], elapsed)
+        batch_seconds['max'] = max(batch_seconds['max'], elapsed)
+        batch_seconds['mean'] += (elapsed - batch_seconds['mean']) / report['batches']
+
+        report['seconds'] = time.time() - start
+        report['docs_per_sec'] = report['documents'] / report['seconds'] if report['seconds'] else 0.0
+        print(f"Inserted batch {report['batches']} ({len(batch)} documents in {elapsed:.3f}s), "
+              f"{report['documents']} documents at {report['docs_per_sec']:.0f} docs/sec", flush=True)
+
+    report['seconds'] = time.time() - start
+    report['docs_per_sec'] = report['documents'] / report['seconds'] if report['seconds'] else 0.0
+
+    return report
+
+
+def stream_file(path, size=None):
+    with open(path, 'rb') as file:
+        return stream_insert(read_chunks(file), size)
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(f"{path}: {stream_file(path)}", flush=True)
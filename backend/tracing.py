@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+import functools
+from collections import deque
+from contextvars import ContextVar
+from threading import Lock
+
+########################################################################################################################
+# Span tracing of the Dash callback requests, callback > figure builder > query > MongoDB command > response encoding
+# Nothing is recorded outside a trace, a span costs a ContextVar lookup then
+history = int(os.environ.get('TRACE_HISTORY', 200))
+
+traces = deque(maxlen=history)
+lock = Lock()
+
+current_trace = ContextVar('current_trace', default=None)
+current_span = ContextVar('current_span', default=None)
+
+
+def start_trace(name):
+    """
+    Starts a trace in the current context and returns it with the token to end it
+    """
+    trace = {'id': uuid.uuid4().hex[:16], 'name': name, 'started': time.time(), 'start': time.perf_counter(),
+             'seconds': None, 'spans': []}
+    return trace, current_trace.set(trace)
+
+
+def end_trace(trace, token, **fields):
+    trace['seconds'] = time.perf_counter() - trace['start']
+    trace.update(fields)
+    current_trace.reset(token)
+
+    # Requests without spans (the polling callbacks of the home page) are not kept
+    if trace['spans']:
+        with lock:
+            traces.append(trace)
+
+
+def open_span(kind, name):
+    """
+    Opens a span under the current one, returns None when there is no trace in this context
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return None
+
+    parent = current_span.get()
+    span = {'id': len(trace['spans']), 'parent': parent['id'] if parent else None, 'kind': kind, 'name': name,
+            'start': time.perf_counter() - trace['start'], 'seconds': None}
+    trace['spans'].append(span)
+
+    return span, current_span.set(span)
+
+
+def close_span(opened, error=None):
+    if opened is None:
+        return
+
+    span, token = opened
+    span['seconds'] = time.perf_counter() - current_trace.get()['start'] - span['start']
+    if error is not None:
+        span['error'] = repr(error)
+    current_span.reset(token)
+
+
+def add_span(kind, name, start, end):
+    """
+    Records a span of the current trace from start to end (perf_counter times) under the current span
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return
+
+    parent = current_span.get()
+    trace['spans'].append({'id': len(trace['spans']), 'parent': parent['id'] if parent else None, 'kind': kind,
+                           'name': name, 'start': start - trace['start'], 'seconds': end - start})
+
+
+def traced_callback(fn):
+    """
+    Decorator of the Dash callback functions, their span ends where the encoding of the response starts
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = current_trace.get()
+        opened = open_span('callback', trace['name'] if trace else fn.__name__)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            close_span(opened, e)
+            raise
+        close_span(opened)
+        if trace is not None:
+            trace['callback_end'] = time.perf_counter()
+        return result
+
+    return wrapper
+
+
+def recent_traces():
+    """
+    Output (list of documents, newest first):
+    [{id, name, started, seconds, spans: [{id, parent, kind, name, start, seconds}, ....], ....}, ....]
+    """
+    with lock:
+        return list(reversed(traces))
@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import queue
+from threading import Condition
+from backend.queries import insert_operation
+from backend.streaming import stream_insert, chunk_size
+from backend.jobs import start, progress
+
+########################################################################################################################
+# Chunked uploads are appended to a spool file and ingested while they arrive, the ingestion job of an upload
+# follows the spool file as it grows in a thread of its own (a slow upload does not hold one of the job workers)
+spool_dir = os.environ.get('UPLOAD_SPOOL_DIR', '.uploads')
+# Seconds finished (or failed) uploads stay listed, and an incomplete upload may go without a chunk
+retention = int(os.environ.get('UPLOAD_RETENTION', 60 * 60))
+idle_timeout = int(os.environ.get('UPLOAD_IDLE_TIMEOUT', 60 * 60))
+# Uploads received and ingested at the same time, a new one is refused (and retried by the client) above it
+max_receiving = int(os.environ.get('UPLOAD_MAX_RECEIVING', 8))
+
+extensions = ('.json', '.ndjson', '.jsonl')
+valid_id = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Uploads of this process by id, resuming works while the process lives (the received offset is kept here)
+uploads = {}
+condition = Condition()
+
+
+def spool_path(upload_id):
+    return os.path.join(spool_dir, f'{upload_id}.part')
+
+
+def status(upload):
+    """
+    Output (dict):
+    {id, job, filename, size, received, documents, state, error, percent, seconds, bytes_per_sec, docs_per_sec}
+
+    state is one of 'receiving', 'done' or 'failed', documents are inserted while receiving
+    """
+    seconds = (upload['finished'] or time.time()) - upload['started']
+    return {**{key: upload[key] for key in ('id', 'job', 'filename', 'size', 'received', 'documents', 'state', 'error')},
+            'percent': 100 * upload['received'] / upload['size'] if upload['size'] else 0.0,
+            'seconds': seconds,
+            'bytes_per_sec': upload['received'] / seconds if seconds else 0.0,
+            'docs_per_sec': upload['documents'] / seconds if seconds else 0.0}
+
+
+def prune(now):
+    """
+    Forgets the uploads finished more than retention seconds ago and drops the incomplete ones (and their spool
+    file) that received nothing for idle_timeout seconds, called with the condition held
+    """
+    for upload_id, upload in list(uploads.items()):
+        if upload['finished'] is not None and now - upload['finished'] > retention:
+            del uploads[upload_id]
+        elif not upload['complete'] and not upload['writing'] and now - upload['updated'] > idle_timeout:
+            # Its ingestion job stops waiting for the rest of the file
+            upload['state'] = 'failed'
+            condition.notify_all()
+            del uploads[upload_id]
+            try:
+                os.remove(spool_path(upload_id))
+            except OSError:
+                pass
+
+
+def upload_status(upload_id):
+    with condition:
+        upload = uploads.get(upload_id)
+        return status(upload) if upload else None
+
+
+def all_uploads():
+    with condition:
+        prune(time.time())
+        return [status(upload) for upload in uploads.values()]
+
+
+def spooled_chunks(upload):
+    """
+    Yields the content of the spool file of upload as it is received, until the last chunk was read
+    """
+    with open(spool_path(upload['id']), 'rb') as file:
+        while True:
+            with condition:
+                while file.tell() >= upload['received'] and not upload['complete']:
+                    if upload['state'] != 'receiving' or not condition.wait(timeout=idle_timeout):
+                        raise TimeoutError(f"Upload {upload['id']} stopped receiving data")
+                # Only the bytes of accepted chunks, a chunk being written is read once received counts it
+                available = upload['received'] - file.tell()
+
+            if available <= 0:
+                return
+            yield file.read(min(available, chunk_size))
+
+
+def ingest(job, upload):
+    """
+    Inserts the documents of upload while it is received and returns the stream_insert report
+    """
+    def insert(batch):
+        insert_operation(batch)
+        progress(job, len(batch))
+        with condition:
+            upload['documents'] += len(batch)
+
+    try:
+        report = stream_insert(spooled_chunks(upload), insert=insert)
+        state, error = 'done', None
+    except Exception as e:
+        report, state, error = None, 'failed', str(e)
+
+    with condition:
+        upload['state'], upload['error'], upload['finished'] = state, error, time.time()
+        condition.notify_all()
+
+    try:
+        os.remove(spool_path(upload['id']))
+    except OSError:
+        pass
+
+    if error:
+        raise RuntimeError(error)
+
+    return report
+
+
+def receive_chunk(upload_id, filename, size, offset, data, final):
+    """
+    Appends a chunk of an upload to its spool file, the first chunk (offset 0) starts its ingestion job
+
+    A chunk whose offset is not the number of bytes received so far is not accepted, the status tells the
+    client where to resend from (after a lost connection it asks for the status first)
+
+    Raises queue.Full (the first chunk is not accepted) when max_receiving uploads are already being ingested,
+    the client resends it later
+
+    Expected Output (tuple):
+    (accepted: bool, status)
+    """
+    if not valid_id.match(upload_id or ''):
+        raise ValueError(f"Invalid upload id {upload_id!r}")
+    if not (filename or '').lower().endswith(extensions):
+        raise ValueError(f"Invalid data file {filename!r}, expected {', '.join(extensions)}")
+
+    with condition:
+        now = time.time()
+        prune(now)
+        upload = uploads.get(upload_id)
+
+        if upload is None:
+            if offset != 0:
+                return False, {'id': upload_id, 'filename': filename, 'size': size, 'received': 0, 'documents': 0,
+                               'state': 'unknown', 'error': 'Unknown upload, restart it from offset 0'}
+            if sum(other['state'] == 'receiving' for other in uploads.values()) >= max_receiving:
+                raise queue.Full
+            os.makedirs(spool_dir, exist_ok=True)
+            open(spool_path(upload_id), 'wb').close()
+            upload = {'id': upload_id, 'job': None, 'filename': filename, 'size': size, 'received': 0,
+                      'documents': 0, 'state': 'receiving', 'error': None, 'complete': False, 'writing': False,
+                      'started': now, 'updated': now, 'finished': None}
+            uploads[upload_id] = upload
+            upload['job'] = start(f'upload {filename}', ingest, upload)
+
+        if upload['state'] != 'receiving' or upload['complete'] or upload['writing'] or offset != upload['received']:
+            return False, status(upload)
+        upload['writing'] = True
+
+    # Written without the condition, the chunks of the other uploads and the status requests do not wait for it
+    try:
+        with open(spool_path(upload_id), 'ab') as file:
+            file.write(data)
+    except Exception:
+        os.truncate(spool_path(upload_id), upload['received'])
+        with condition:
+            upload['writing'] = False
+        raise
+
+    with condition:
+        upload['received'] += len(data)
+        upload['complete'] = bool(final)
+        upload['writing'] = False
+        upload['updated'] = time.time()
+        condition.notify_all()
+
+        return True, status(upload)
@@ -1,22 +1,35 @@
+import os
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output
 
-from apps import home, codes, countries, businesses
+from apps import home, codes, countries, businesses, routes, diagnostics
 from apps.sidebar import render_sidebar
 from apps.navbar import Navbar
 import pandas as pd
-from app import app
+from app import app, diagnostics_enabled
+from backend.indexes import ensure_indexes
+from backend.DB import warm_pool
+from loadgen import install_recorder
 
 server = app.server
 
-sidebar = render_sidebar()
+# Record the callback requests for loadgen.py replay
+if os.environ.get('CALLBACK_RECORD_FILE'):
+    install_recorder(server, os.environ['CALLBACK_RECORD_FILE'])
+
 navbar = Navbar()
 
 content = html.Div(id="content", className='content')
 
-app.layout = html.Div([dcc.Location(id="url", refresh=False), navbar, sidebar, content])
+
+def serve_layout():
+    # Built per page load (and not at import), the country dropdown of the sidebar has the current dimension values
+    return html.Div([dcc.Location(id="url", refresh=False), navbar, render_sidebar(), content])
+
+
+app.layout = serve_layout
 
 
 @app.callback(Output("content", "children"), [Input("url", "pathname")])
@@ -24,11 +37,13 @@ def render_page_content(pathname):
     if pathname in ["/", "/home"]:
         return home.layout
     elif pathname == "/codes":
-        return codes.layout
+        return codes.render_layout()
     elif pathname == "/countries":
         return countries.layout
     elif pathname == "/businesses":
         return businesses.layout
+    elif pathname == "/diagnostics" and diagnostics_enabled:
+        return diagnostics.layout
     # If the user tries to reach a different page, return a 404 message
     return dbc.Jumbotron(
         [
@@ -41,4 +56,14 @@ def render_page_content(pathname):
 
 
 if __name__ == '__main__':
+    try:
+        warm_pool()
+    except Exception as e:
+        print(f'Could not connect to MongoDB: {e}', flush=True)
+
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f'Could not create the query indexes: {e}', flush=True)
+
     app.run_server(debug=True, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,313 @@
+import json
+import time
+import random
+import argparse
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
+from backend.benchmark import random_filters, summarise
+from backend.dimensions import seed_cpv
+
+########################################################################################################################
+# Load generator for the Dash callbacks of index.py, simulated users or the replay of recorded callback traffic,
+# in process (Flask test client) or against a running server (--url)
+callback_path = '/_dash-update-component'
+dependencies_path = '/_dash-dependencies'
+layout_path = '/_dash-layout'
+
+# Submit button of each page
+pages = {'/codes': 'button_code', '/countries': 'button_country', '/businesses': 'button_business'}
+
+# Connections a browser opens to the same server, callbacks of a page beyond it wait
+browser_connections = 6
+
+
+def make_client(url=None):
+    """
+    Returns (get(path) -> json, post(path, payload) -> status, post_json(path, payload) -> json) for the server
+    at url, or for index.py in process
+    """
+    if url is None:
+        from index import server
+        client = server.test_client()
+
+        def get(path):
+            return json.loads(client.get(path).get_data())
+
+        def post(path, payload):
+            return client.post(path, json=payload).status_code
+
+        def post_json(path, payload):
+            return json.loads(client.post(path, json=payload).get_data())
+    else:
+        import requests
+        session = requests.Session()
+        url = url.rstrip('/')
+
+        def get(path):
+            return session.get(url + path).json()
+
+        def post(path, payload):
+            return session.post(url + path, json=payload).status_code
+
+        def post_json(path, payload):
+            return session.post(url + path, json=payload).json()
+
+    return get, post, post_json
+
+
+def outputs(dependency):
+    """
+    Returns the [{id, property}, ....] outputs of a callback ('id.property' or '..id.property...id.property..')
+    """
+    output = dependency['output']
+    items = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [dict(zip(('id', 'property'), item.rsplit('.', 1))) for item in items]
+
+
+def callback_name(dependency):
+    return ','.join(f"{item['id']}.{item['property']}" for item in outputs(dependency))
+
+
+def callback_payload(dependency, values):
+    """
+    Returns the request body the Dash renderer sends for a callback, values are {(id, property): value}
+    """
+    items = outputs(dependency)
+
+    def with_values(props):
+        return [{'id': prop['id'], 'property': prop['property'], 'value': values.get((prop['id'], prop['property']))}
+                for prop in props]
+
+    return {'output': dependency['output'],
+            'outputs': items if dependency['output'].startswith('..') else items[0],
+            'inputs': with_values(dependency['inputs']),
+            'state': with_values(dependency.get('state', [])),
+            'changedPropIds': [f"{prop['id']}.{prop['property']}" for prop in dependency['inputs']]}
+
+
+def component_ids(layout):
+    """
+    Returns the ids of the components of a layout (or of the layout in a callback response)
+    """
+    ids = set()
+    items = [layout]
+    while items:
+        item = items.pop()
+        if isinstance(item, dict):
+            if isinstance(item.get('props'), dict) and isinstance(item['props'].get('id'), str):
+                ids.add(item['props']['id'])
+            items.extend(item.values())
+        elif isinstance(item, list):
+            items.extend(item)
+    return ids
+
+
+def page_components(get, post_json, dependencies):
+    """
+    Returns {page: ids of the components a browser has on the page}, the ids of the app layout (navbar, sidebar)
+    and of the page content rendered by its url callback
+    """
+    shell = component_ids(get(layout_path))
+    routers = [dependency for dependency in page_callbacks(dependencies, ('url', 'pathname'))
+               if all(item['id'] in shell for item in outputs(dependency))]
+
+    components = {}
+    for page in pages:
+        components[page] = set(shell)
+        for dependency in routers:
+            components[page] |= component_ids(post_json(callback_path,
+                                                        callback_payload(dependency, {('url', 'pathname'): page})))
+    return components
+
+
+def page_callbacks(dependencies, trigger, components=None):
+    """
+    Returns the callbacks trigger fires, only those whose outputs are all in components when given
+    """
+    return [dependency for dependency in dependencies
+            if any((prop['id'], prop['property']) == trigger for prop in dependency['inputs'])
+            and (components is None or all(item['id'] in components for item in outputs(dependency)))]
+
+
+def new_stats():
+    return {'stats': {}, 'lock': Lock(), 'start': time.time()}
+
+
+def record(stats, name, started, status):
+    elapsed = time.time() - started
+    with stats['lock']:
+        callback = stats['stats'].setdefault(name, {'latencies': [], 'errors': 0})
+        if status is None or status >= 400:
+            callback['errors'] += 1
+        else:
+            callback['latencies'].append(elapsed)
+
+
+def send(post, stats, name, payload):
+    started = time.time()
+    try:
+        status = post(callback_path, payload)
+    except Exception as e:
+        print(f"{name} failed: {e}", flush=True)
+        status = None
+    record(stats, name, started, status)
+
+
+def results(stats):
+    """
+    Output (dict):
+    {seconds: float, callbacks: {callback name: {runs, errors, error_rate, throughput, p50, p95, p99, ....}, ....}}
+    """
+    seconds = time.time() - stats['start']
+    report = {'seconds': seconds, 'callbacks': {}}
+
+    with stats['lock']:
+        for name, callback in sorted(stats['stats'].items()):
+            summary = summarise(callback['latencies'], callback['errors'])
+            sent = summary['runs'] + summary['errors']
+            summary['error_rate'] = summary['errors'] / sent if sent else 0.0
+            summary['throughput'] = sent / seconds if seconds else 0.0
+            report['callbacks'][name] = summary
+
+    return report
+
+
+def simulate_user(user, post, dependencies, components, stats, deadline, think, seed):
+    """
+    A user opens one of the pages and presses its Submit button with random filters, until deadline
+
+    Only the callbacks of the components on the page are sent, like the browser (components, see page_components)
+    """
+    rng = random.Random(seed + user)
+    filters = random_filters(1000, seed + user)
+    clicks = 0
+
+    with ThreadPoolExecutor(max_workers=browser_connections) as browser:
+        while time.time() < deadline:
+            page = rng.choice(list(pages))
+            bot_year, top_year, country_list = filters[clicks % len(filters)]
+            clicks += 1
+
+            values = {('url', 'pathname'): page,
+                      (pages[page], 'n_clicks'): clicks,
+                      ('year_slider', 'value'): [bot_year, top_year],
+                      ('country_drop', 'value'): country_list,
+                      ('cpv_drop', 'value'): rng.choice(sorted(seed_cpv))}
+
+            for trigger in [('url', 'pathname'), (pages[page], 'n_clicks')]:
+                wait([browser.submit(send, post, stats, callback_name(dependency), callback_payload(dependency, values))
+                      for dependency in page_callbacks(dependencies, trigger, components[page])])
+
+            time.sleep(rng.uniform(0, think * 2))
+
+
+def run_users(users, duration, think=1.0, seed=42, url=None):
+    """
+    Simulates users concurrent analysts for duration seconds, think is their mean pause between submits
+    """
+    get, post, post_json = make_client(url)
+    dependencies = get(dependencies_path)
+    components = page_components(get, post_json, dependencies)
+    stats = new_stats()
+    deadline = time.time() + duration
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        wait([executor.submit(simulate_user, user, post, dependencies, components, stats, deadline, think, seed)
+              for user in range(users)])
+
+    return results(stats)
+
+
+def install_recorder(server, path):
+    """
+    Appends every callback request served by server to path (one JSON document per line) for replay
+    """
+    from flask import request, g
+    lock = Lock()
+
+    @server.before_request
+    def start_recording():
+        g.recording_start = time.time()
+
+    @server.after_request
+    def record_callback(response):
+        if request.path.endswith(callback_path) and 'recording_start' in g:
+            line = json.dumps({'t': g.recording_start, 'seconds': time.time() - g.recording_start,
+                               'status': response.status_code, 'payload': request.get_json(silent=True)})
+            with lock:
+                with open(path, 'a') as file:
+                    file.write(line + '\n')
+        return response
+
+
+def replay(path, speed=1.0, url=None, concurrency=32):
+    """
+    Sends the recorded callback requests of path with the recorded spacing divided by speed
+    """
+    with open(path) as file:
+        recorded = [json.loads(line) for line in file if line.strip()]
+
+    # Lines are written when the responses are sent, replay in request order
+    recorded.sort(key=lambda call: call['t'])
+
+    get, post, post_json = make_client(url)
+    stats = new_stats()
+
+    if not recorded:
+        return results(stats)
+
+    first = recorded[0]['t']
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for call in recorded:
+            delay = stats['start'] + (call['t'] - first) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not isinstance(call.get('payload'), dict) or 'output' not in call['payload']:
+                # The request body was not a callback (recorded as null), counted as an error and not sent
+                record(stats, 'unrecorded payload', time.time(), None)
+                continue
+            futures.append(executor.submit(send, post, stats, callback_name(call['payload']), call['payload']))
+        wait(futures)
+
+    return results(stats)
+
+
+def print_results(report):
+    print(f"{'callback':60} {'requests/s':>10} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}", flush=True)
+    for name, summary in report['callbacks'].items():
+        print(f"{name[:60]:60} {summary['throughput']:10.2f} {summary['error_rate']:7.1%} "
+              f"{summary.get('p50', 0) * 1000:8.1f} {summary.get('p95', 0) * 1000:8.1f} "
+              f"{summary.get('p99', 0) * 1000:8.1f}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the dashboard callbacks')
+    parser.add_argument('--url', help='server to load (default: index.py in process)')
+    parser.add_argument('--output', help='JSON report file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    users_parser = commands.add_parser('users', help='simulate concurrent users')
+    users_parser.add_argument('--users', type=int, default=10)
+    users_parser.add_argument('--duration', type=float, default=60)
+    users_parser.add_argument('--think', type=float, default=1.0, help='mean seconds between submits')
+    users_parser.add_argument('--seed', type=int, default=42)
+
+    replay_parser = commands.add_parser('replay', help='replay callbacks recorded with CALLBACK_RECORD_FILE')
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='1 for real time, 10 for 10x faster')
+    replay_parser.add_argument('--concurrency', type=int, default=32)
+
+    args = parser.parse_args()
+
+    if args.command == 'users':
+        result = run_users(args.users, args.duration, args.think, args.seed, args.url)
+    else:
+        result = replay(args.file, args.speed, args.url, args.concurrency)
+
+    print_results(result)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
@@ -0,0 +1,77 @@
+import json
+import pytest
+from backend.streaming import iter_documents, stream_insert
+
+documents = [{'ID_NOTICE_CAN': 1, 'CAE_NAME': 'Câmara Municipal de Lisboa', 'VALUE_EURO': 12345.5},
+             {'ID_NOTICE_CAN': 22, 'B_EU_FUNDS': 'Y', 'CPV': '50000000', 'NAMES': ['a,]', '"b"']},
+             {'ID_NOTICE_CAN': 333, 'VALUE_EURO': -1.5e3, 'FLAGS': [True, False, None], 'NESTED': {}}]
+
+samples = {
+    'array': json.dumps(documents, ensure_ascii=False),
+    'array_spaced': ' [\n ' + ' ,\n '.join(json.dumps(document) for document in documents) + '\n] \n',
+    'ndjson': '\n'.join(json.dumps(document, ensure_ascii=False) for document in documents) + '\n',
+    'ndjson_unterminated': '\n'.join(json.dumps(document) for document in documents),
+    'bom': '﻿' + json.dumps(documents),
+}
+
+malformed = ['[,{"a": 1}]', '[{"a": 1},,{"b": 2}]', '[{"a": 1},]', '[{"a": 1} {"b": 2}]', '[{"a": 1}] {"b": 2}',
+             '[{"a": 1}', '{"a": 1', '[{"a": 1},', ',{"a": 1}', '{"a": 1},{"b": 2}', '[{"a": tru}]', '[1, 2]',
+             '{"a": 1}\n12345\n', '"x"', '[{"a": 1}, [2]]']
+
+
+def splits(data):
+    """
+    Every way of cutting data into 3 chunks (some of them empty)
+    """
+    for first in range(len(data) + 1):
+        for second in range(first, len(data) + 1):
+            yield [data[:first], data[first:second], data[second:]]
+
+
+@pytest.mark.parametrize('name', sorted(samples))
+def test_every_chunk_boundary(name):
+    data = samples[name].encode()
+    for chunks in splits(data):
+        assert list(iter_documents(chunks)) == documents, chunks
+
+
+def test_text_chunks():
+    text = samples['array']
+    for size in range(1, 40):
+        chunks = [text[start:start + size] for start in range(0, len(text), size)]
+        assert list(iter_documents(chunks)) == documents
+
+
+def test_empty():
+    assert list(iter_documents([])) == []
+    assert list(iter_documents([b'[]'])) == []
+    assert list(iter_documents([b' \n'])) == []
+
+
+@pytest.mark.parametrize('text', malformed)
+def test_malformed(text):
+    data = text.encode()
+    for chunks in splits(data):
+        with pytest.raises(ValueError):
+            list(iter_documents(chunks))
+
+
+def test_number_split_across_chunks():
+    assert list(iter_documents([b'[{"a": 1', b'2}, {"b": 3.', b'5e1}]'])) == [{'a': 12}, {'b': 35.0}]
+
+
+def test_not_an_object():
+    with pytest.raises(ValueError, match='document 2 is not an object'):
+        list(iter_documents([b'{"a": 1}\n12345\n{"b": 2}\n']))
+
+
+def test_stream_insert_batches():
+    inserted = []
+    data = '\n'.join(json.dumps({'n': n}) for n in range(25)).encode()
+
+    report = stream_insert([data[start:start + 7] for start in range(0, len(data), 7)], size=10,
+                           insert=inserted.append)
+
+    assert [len(batch) for batch in inserted] == [10, 10, 5]
+    assert [document['n'] for batch in inserted for document in batch] == list(range(25))
+    assert report['documents'] == 25 and report['batches'] == 3